@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_cache(django_test_environment):
+    """Пустой кеш во временном каталоге на время тестов (см.
+    core.test_runner)."""
+    from core.test_runner import temporary_cache
+    with temporary_cache():
+        yield
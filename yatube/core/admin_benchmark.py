@@ -0,0 +1,73 @@
+"""Замеры списков объектов в админке.
+
+Для постов, комментариев и подписок снимаются задержка, число запросов
+и размер ответа первой и десятой страницы списка, уровней иерархии дат
+и поиска. Прогон на наборах данных разного размера (generate_dataset)
+показывает, растёт ли время страницы вместе с таблицей.
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from posts.models import Comment, Follow, Post
+
+from .benchmarks import run_case
+from .changelist import estimated_count, local_date
+
+
+User = get_user_model()
+
+# Модель, поле иерархии дат и поле, из которого берётся строка поиска.
+CHANGELISTS = (
+    (Post, 'pub_date', 'text'),
+    (Comment, 'created', 'text'),
+    (Follow, None, 'user__username'),
+)
+
+
+def search_term(model, field):
+    value = model.objects.values_list(field, flat=True).first()
+    return value.split()[0] if value else ''
+
+
+def cases():
+    """Список (имя, адрес) для всех списков CHANGELISTS."""
+    found = []
+    for model, date_field, search_field in CHANGELISTS:
+        opts = model._meta
+        name = f'{opts.app_label}_{opts.model_name}'
+        url = reverse(f'admin:{name}_changelist')
+        found += [(name, url), (f'{name} page 10', f'{url}?p=9')]
+        last = (model.objects.aggregate(last=Max(date_field))['last']
+                if date_field else None)
+        if last is not None:
+            day = local_date(last)
+            year = f'{url}?{date_field}__year={day.year}'
+            found += [(f'{name} year', year),
+                      (f'{name} month',
+                       f'{year}&{date_field}__month={day.month}')]
+        found.append((f'{name} search', f'{url}?' + urlencode(
+            {'q': search_term(model, search_field)})))
+    return found
+
+
+def dataset_size():
+    return {model._meta.model_name: estimated_count(model, 'default')
+            for model, _, _ in CHANGELISTS}
+
+
+def run(iterations=20, warmup=2, only=None):
+    # Свой суперпользователь на время замера. Замер идёт вне транзакции:
+    # открытая на весь прогон, она держала бы блокировку записи SQLite
+    # (BEGIN IMMEDIATE) и останавливала всех, кто пишет в живую базу.
+    admin = User.objects.create_superuser(
+        f'benchmark-admin-{uuid.uuid4().hex[:8]}', None, None)
+    try:
+        return {name: run_case(url, admin, iterations, warmup)
+                for name, url in cases()
+                if not only or name in only}
+    finally:
+        admin.delete()
@@ -0,0 +1,31 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+from core.sqlite import TRANSACTION_MODES, apply_pragmas
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с прагмами и режимом транзакций из OPTIONS.
+
+    OPTIONS['pragmas'] выполняются на каждом новом соединении,
+    OPTIONS['transaction_mode'] задаёт, как atomic() начинает транзакцию
+    (DEFERRED, IMMEDIATE или EXCLUSIVE).
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode',
+                                           'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'Неизвестный transaction_mode {self.transaction_mode}')
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
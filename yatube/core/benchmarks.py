@@ -0,0 +1,152 @@
+"""Замеры страниц тестовым клиентом Django.
+
+Для каждого адреса из posts, users и about снимаются задержка
+(p50/p95/p99), число SQL-запросов и размер ответа - отдельно для гостя
+и для вошедшего пользователя. Маршруты из WRITING_ROUTES меняют данные
+даже по GET и не замеряются: прогон на настоящем наборе данных иначе
+создавал бы подписки и завершал сессию читателя. Результаты - обычный
+JSON, их можно сравнивать между прогонами и проверять по файлу
+бюджетов.
+"""
+import time
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Group, Post, User
+from tasks.stats import percentile
+from users import urls as users_urls
+
+from .budgets import ANONYMOUS, AUTHENTICATED, METRICS, budget_for
+
+
+URLCONFS = (posts_urls, users_urls, about_urls)
+WRITING_ROUTES = ('posts:profile_follow', 'posts:profile_unfollow',
+                  'users:logout')
+
+
+def sample_objects():
+    """Самые тяжёлые объекты набора данных: популярный автор, пост
+    с наибольшим числом комментариев, самая большая группа и читатель
+    с наибольшим числом подписок."""
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    if post is None:
+        return None
+    author = User.objects.order_by('-counters__followers', 'pk').first()
+    reader = User.objects.order_by('-counters__following', 'pk').first()
+    group = Group.objects.annotate(size=Count('posts')).order_by(
+        '-size', 'pk').first()
+    return {'post': post, 'author': author, 'reader': reader,
+            'group': group}
+
+
+def url_arguments(objects):
+    reader = objects['reader']
+    return {
+        'slug': objects['group'].slug if objects['group'] else 'missing',
+        'username': objects['author'].username,
+        'post_id': objects['post'].pk,
+        'uidb64': urlsafe_base64_encode(force_bytes(reader.pk)),
+        'token': default_token_generator.make_token(reader),
+    }
+
+
+def cases(objects):
+    """Список (имя, адрес) для всех маршрутов приложений, кроме
+    WRITING_ROUTES."""
+    arguments = url_arguments(objects)
+    found = []
+    for urlconf in URLCONFS:
+        for pattern in urlconf.urlpatterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            name = f'{urlconf.app_name}:{pattern.name}'
+            if name in WRITING_ROUTES:
+                continue
+            kwargs = {key: arguments[key]
+                      for key in pattern.pattern.regex.groupindex}
+            found.append((name, reverse(name, kwargs=kwargs)))
+    return found
+
+
+def measure(client, url, login=None, cold=False):
+    if login is not None and '_auth_user_id' not in client.session:
+        client.force_login(login)
+    if cold:
+        cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url, HTTP_HOST='localhost')
+        elapsed = time.perf_counter() - started
+    return {'ms': elapsed * 1000, 'queries': len(queries),
+            'bytes': len(response.content), 'status': response.status_code}
+
+
+def run_case(url, login=None, iterations=20, warmup=2, cold=False):
+    client = Client()
+    for _ in range(warmup):
+        measure(client, url, login, cold)
+    samples = [measure(client, url, login, cold) for _ in range(iterations)]
+    timings = sorted(sample['ms'] for sample in samples)
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'queries': max(sample['queries'] for sample in samples),
+        'bytes': max(sample['bytes'] for sample in samples),
+        'status': samples[-1]['status'],
+    }
+
+
+def run(objects, iterations=20, warmup=2, cold=False, only=None):
+    results = {}
+    for name, url in cases(objects):
+        if only and name not in only:
+            continue
+        results[name] = {
+            ANONYMOUS: run_case(url, None, iterations, warmup, cold),
+            AUTHENTICATED: run_case(url, objects['reader'], iterations,
+                                    warmup, cold),
+        }
+    return results
+
+
+def dataset_size():
+    return {'users': User.objects.count(), 'posts': Post.objects.count(),
+            'groups': Group.objects.count()}
+
+
+def compare(previous, current):
+    """Изменения метрик относительно прошлого прогона: (имя, кто, метрика,
+    было, стало)."""
+    changes = []
+    for name, kinds in current.items():
+        for kind, metrics in kinds.items():
+            before = previous.get(name, {}).get(kind)
+            if before is None:
+                continue
+            for metric in METRICS:
+                if before.get(metric) != metrics[metric]:
+                    changes.append((name, kind, metric, before.get(metric),
+                                    metrics[metric]))
+    return changes
+
+
+def violations(results, budgets):
+    found = []
+    for name, kinds in results.items():
+        for kind, metrics in kinds.items():
+            for metric, limit in budget_for(budgets, name, kind).items():
+                if metrics[metric] > limit:
+                    found.append((name, kind, metric, metrics[metric],
+                                  limit))
+    return found
@@ -0,0 +1,36 @@
+"""Бюджеты страниц: лимиты задержки, числа запросов и размера ответа.
+
+Файл BENCHMARK_BUDGETS (по умолчанию benchmark_budgets.json) читают
+и benchmark_views, и QueryInstrumentationMiddleware.
+"""
+import json
+import os
+
+from django.conf import settings
+
+
+BUDGETS = getattr(settings, 'BENCHMARK_BUDGETS',
+                  os.path.join(settings.BASE_DIR, 'benchmark_budgets.json'))
+ANONYMOUS = 'anonymous'
+AUTHENTICATED = 'authenticated'
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'bytes')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def load_budgets(path=BUDGETS):
+    return load(path) if path and os.path.exists(path) else {}
+
+
+def budget_for(budgets, name, kind):
+    """Бюджет страницы: общий ('*'), страницы и конкретного типа
+    пользователя - более точные значения перекрывают общие."""
+    merged = {}
+    for scope in (budgets.get('*', {}), budgets.get(name, {})):
+        merged.update({key: value for key, value in scope.items()
+                       if key in METRICS})
+        merged.update(scope.get(kind, {}))
+    return merged
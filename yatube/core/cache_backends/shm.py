@@ -0,0 +1,247 @@
+"""Кеш в общей памяти для нескольких процессов на одной машине.
+
+Файл LOCATION (лучше на tmpfs, например /dev/shm) отображается в память
+каждого процесса. Он разбит на SLOTS ячеек по SLOT_SIZE байт, ячейки
+сгруппированы в наборы по WAYS штук: ключ может лежать только в наборе
+hash(ключ) % число наборов. Внутри набора место освобождается по
+алгоритму CLOCK: чтение ставит ячейке бит обращения, стрелка набора
+пропускает ячейки с битом (сбрасывая его) и вытесняет первую без него.
+
+Набор защищён блокировкой fcntl на его байт в заголовке (между
+процессами) и обычной блокировкой (между потоками процесса). Значение,
+которое не помещается в ячейку, сжимается zlib; если не помещается и
+сжатое, оно не кешируется.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from fcntl import LOCK_EX, LOCK_SH, LOCK_UN, lockf
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+MAGIC = b'YTSHM001'
+# magic, ячеек, размер ячейки, ячеек в наборе.
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 64
+# hash, срок, флаги, бит обращения, длина ключа, длина значения.
+SLOT = struct.Struct('<QdBBHI')
+# Смещение бита обращения в заголовке ячейки.
+REFERENCED = 17
+COMPRESSED = 1
+THREAD_LOCKS = 64
+
+# Отображения файлов по LOCATION, pid и геометрии: после fork у процесса
+# должны быть свои блокировки потоков.
+_segments = {}
+_segments_lock = threading.Lock()
+
+
+def key_hash(key):
+    return int.from_bytes(
+        hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class Segment:
+    def __init__(self, path, slots, slot_size, ways):
+        self.ways = ways
+        self.sets = max(1, slots // ways)
+        self.slot_size = slot_size
+        # Стрелки CLOCK - по байту на набор сразу после заголовка; на этих
+        # же байтах берутся блокировки fcntl наборов.
+        self.slots_offset = -(-(HEADER_SIZE + self.sets) // mmap.PAGESIZE) * (
+            mmap.PAGESIZE)
+        size = self.slots_offset + self.sets * ways * slot_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        lockf(self.fd, LOCK_EX)
+        try:
+            header = HEADER.pack(MAGIC, self.sets * ways, slot_size, ways)
+            if (os.fstat(self.fd).st_size != size
+                    or os.pread(self.fd, HEADER.size, 0) != header):
+                # Новый файл или другая геометрия: начинаем с нуля.
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, header, 0)
+        finally:
+            lockf(self.fd, LOCK_UN)
+        self.map = mmap.mmap(self.fd, size)
+        self.thread_locks = [threading.Lock() for _ in range(THREAD_LOCKS)]
+
+    @contextmanager
+    def locked(self, index, exclusive):
+        with self.thread_locks[index % THREAD_LOCKS]:
+            lockf(self.fd, LOCK_EX if exclusive else LOCK_SH, 1,
+                  HEADER_SIZE + index)
+            try:
+                yield
+            finally:
+                lockf(self.fd, LOCK_UN, 1, HEADER_SIZE + index)
+
+    def offsets(self, index):
+        first = self.slots_offset + index * self.ways * self.slot_size
+        return range(first, first + self.ways * self.slot_size,
+                     self.slot_size)
+
+    def find(self, index, digest, key):
+        for offset in self.offsets(index):
+            hashed, expires, flags, _, key_size, size = SLOT.unpack_from(
+                self.map, offset)
+            start = offset + SLOT.size
+            if (key_size and hashed == digest
+                    and self.map[start:start + key_size] == key):
+                return offset, expires, flags, start + key_size, size
+        return None
+
+    def victim(self, index):
+        """Ячейка для новой записи: пустая, просроченная или по CLOCK."""
+        now = time.time()
+        offsets = self.offsets(index)
+        for offset in offsets:
+            _, expires, _, _, key_size, _ = SLOT.unpack_from(self.map, offset)
+            if not key_size or expires <= now:
+                return offset
+        hand_offset = HEADER_SIZE + index
+        hand = self.map[hand_offset]
+        while True:
+            offset = offsets[hand]
+            hand = (hand + 1) % self.ways
+            if self.map[offset + REFERENCED]:
+                self.map[offset + REFERENCED] = 0
+                continue
+            self.map[hand_offset] = hand
+            return offset
+
+    def write(self, offset, digest, key, data, expires, flags):
+        # Бит обращения новой записи сброшен: второй шанс при вытеснении
+        # получают только ключи, которые читали.
+        SLOT.pack_into(self.map, offset, digest, expires, flags, 0,
+                       len(key), len(data))
+        start = offset + SLOT.size
+        self.map[start:start + len(key) + len(data)] = key + data
+
+    def erase(self, offset):
+        SLOT.pack_into(self.map, offset, 0, 0, 0, 0, 0, 0)
+
+    def clear(self):
+        lockf(self.fd, LOCK_EX)
+        try:
+            for index in range(self.sets):
+                for offset in self.offsets(index):
+                    self.erase(offset)
+        finally:
+            lockf(self.fd, LOCK_UN)
+
+
+def open_segment(path, slots, slot_size, ways):
+    with _segments_lock:
+        key = (path, os.getpid(), slots, slot_size, ways)
+        if key not in _segments:
+            _segments[key] = Segment(path, slots, slot_size, ways)
+        return _segments[key]
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.slots = int(options.get('SLOTS', 2048))
+        self.slot_size = int(options.get('SLOT_SIZE', 64 * 1024))
+        self.ways = int(options.get('WAYS', 8))
+        if not 0 < self.ways < 256:
+            raise ValueError('WAYS должно быть от 1 до 255')
+
+    @property
+    def _segment(self):
+        return open_segment(self.path, self.slots, self.slot_size,
+                            self.ways)
+
+    def _locate(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        raw = key.encode()
+        digest = key_hash(raw)
+        return raw, digest, digest % self._segment.sets
+
+    def _encode(self, value, room):
+        data = pickle.dumps(value, self.pickle_protocol)
+        if len(data) > room:
+            return zlib.compress(data, 1), COMPRESSED
+        return data, 0
+
+    def _expiry(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return float('inf') if expires is None else expires
+
+    def _store(self, key, value, timeout, version, only_new):
+        raw, digest, index = self._locate(key, version)
+        segment = self._segment
+        room = segment.slot_size - SLOT.size - len(raw)
+        data, flags = self._encode(value, room)
+        expires = self._expiry(timeout)
+        fits = len(data) <= room
+        with segment.locked(index, exclusive=True):
+            found = segment.find(index, digest, raw)
+            if found and only_new and found[1] > time.time():
+                return False
+            if not fits or expires <= time.time():
+                if found:
+                    segment.erase(found[0])
+                return False
+            offset = found[0] if found else segment.victim(index)
+            segment.write(offset, digest, raw, data, expires, flags)
+        return True
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(key, value, timeout, version, only_new=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(key, value, timeout, version, only_new=True)
+
+    def get(self, key, default=None, version=None):
+        raw, digest, index = self._locate(key, version)
+        segment = self._segment
+        with segment.locked(index, exclusive=False):
+            found = segment.find(index, digest, raw)
+            if found is None or found[1] <= time.time():
+                return default
+            offset, _, flags, start, size = found
+            segment.map[offset + REFERENCED] = 1
+            data = segment.map[start:start + size]
+        if flags & COMPRESSED:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, digest, index = self._locate(key, version)
+        segment = self._segment
+        with segment.locked(index, exclusive=True):
+            found = segment.find(index, digest, raw)
+            if found is None or found[1] <= time.time():
+                return False
+            struct.pack_into('<d', segment.map, found[0] + 8,
+                             self._expiry(timeout))
+        return True
+
+    def delete(self, key, version=None):
+        raw, digest, index = self._locate(key, version)
+        segment = self._segment
+        with segment.locked(index, exclusive=True):
+            found = segment.find(index, digest, raw)
+            if found:
+                segment.erase(found[0])
+
+    def has_key(self, key, version=None):
+        sentinel = object()
+        return self.get(key, sentinel, version) is not sentinel
+
+    def clear(self):
+        self._segment.clear()
@@ -0,0 +1,288 @@
+"""Двухуровневый кеш: LRU в памяти процесса (L1) и общий для процессов
+файл SQLite (L2).
+
+Чтение идёт сначала в L1, затем в L2; найденное в L2 копируется в L1
+не дольше чем на L1_TIMEOUT секунд - это предел, на который другой
+процесс может отстать от set()/delete(). Ключи с префиксами из L2_ONLY
+в L1 не попадают вовсе: так хранят указатели вроде версий лент, которые
+должны быть одинаковыми во всех процессах.
+
+get_or_set() пересчитывает истёкший ключ в одном запросе на все процессы
+(блокировка в L2). Остальные запросы, пока идёт пересчёт, получают
+устаревшее значение, если оно истекло не более STALE_TIMEOUT секунд
+назад, или ждут результат до WAIT_TIMEOUT секунд.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS locks ('
+    'key TEXT PRIMARY KEY, expires REAL NOT NULL)',
+)
+FOREVER = float('inf')
+# Через сколько записанных ключей L2 чистится от просроченного.
+CULL_EVERY = 100
+
+# L1 общий для всех экземпляров бэкенда с одним LOCATION в процессе:
+# Django создаёт свой экземпляр кеша в каждом потоке.
+_memory = {}
+_locks = {}
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.l2_only = tuple(options.get('L2_ONLY', ()))
+        self.stale_timeout = float(options.get('STALE_TIMEOUT', 60))
+        self.lock_timeout = float(options.get('LOCK_TIMEOUT', 30))
+        self.wait_timeout = float(options.get('WAIT_TIMEOUT', 5))
+        self._memory = _memory.setdefault(location, OrderedDict())
+        self._lock = _locks.setdefault(location, threading.Lock())
+        self._local = threading.local()
+
+    # L2
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != (
+                os.getpid()):
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode = wal')
+            # Потеря последних записей кеша при сбое питания не страшна.
+            connection.execute('PRAGMA synchronous = off')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.writes = 0
+        return connection
+
+    def _l2_get(self, keys, stale=False):
+        """{ключ: (pickle, срок)} для живых (или устаревших не более
+        STALE_TIMEOUT секунд назад) ключей."""
+        if not keys:
+            return {}
+        now = time.time()
+        if stale:
+            now -= self.stale_timeout
+        marks = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value, expires FROM cache WHERE key IN ({marks}) '
+            'AND (expires IS NULL OR expires > ?)', [*keys, now])
+        return {key: (value, FOREVER if expires is None else expires)
+                for key, value, expires in rows}
+
+    def _l2_set(self, items):
+        """items - список (ключ, pickle, срок или None)."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany('INSERT OR REPLACE INTO cache (key, value, '
+                           'expires) VALUES (?, ?, ?)', items)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._local.writes += len(items)
+        if self._local.writes >= CULL_EVERY:
+            self._local.writes = 0
+            self._cull()
+
+    def _cull(self):
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires < ?',
+                   (time.time() - self.stale_timeout,))
+        db.execute('DELETE FROM locks WHERE expires < ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,))
+
+    def _acquire(self, key):
+        now = time.time()
+        cursor = self._db.execute(
+            'INSERT INTO locks (key, expires) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET expires = excluded.expires '
+            'WHERE locks.expires < ?', (key, now + self.lock_timeout, now))
+        return cursor.rowcount == 1
+
+    def _release(self, key):
+        self._db.execute('DELETE FROM locks WHERE key = ?', (key,))
+
+    # L1
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            pickled, expires = entry
+            if expires <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return pickled
+
+    def _l1_set(self, key, pickled, expires):
+        if self._l1_excluded(key):
+            return
+        expires = min(expires, time.time() + self.l1_timeout)
+        with self._lock:
+            self._memory[key] = (pickled, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.l1_max_entries:
+                self._memory.popitem(last=False)
+
+    def _l1_excluded(self, key):
+        # make_key() по умолчанию даёт 'префикс:версия:ключ'.
+        return bool(self.l2_only) and key.split(':', 2)[-1].startswith(
+            self.l2_only)
+
+    def _l1_delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+
+    # API кеша Django
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expiry(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return FOREVER if expires is None else expires
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        found = {}
+        missing = []
+        for key in names:
+            pickled = self._l1_get(key)
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickled
+        for key, (pickled, expires) in self._l2_get(missing).items():
+            self._l1_set(key, pickled, expires)
+            found[key] = pickled
+        return {names[key]: pickle.loads(pickled)
+                for key, pickled in found.items()}
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        items = [(self._key(key, version),
+                  pickle.dumps(value, self.pickle_protocol))
+                 for key, value in data.items()]
+        self._l1_delete(key for key, _ in items)
+        if expires <= time.time():
+            self.delete_many(data, version)
+            return []
+        self._l2_set([(key, pickled, None if expires == FOREVER else expires)
+                      for key, pickled in items])
+        for key, pickled in items:
+            self._l1_set(key, pickled, expires)
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._key(key, version)
+        expires = self._expiry(timeout)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        now = time.time()
+        cursor = self._db.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (name, pickled, None if expires == FOREVER else expires, now))
+        if cursor.rowcount != 1:
+            return False
+        self._l1_set(name, pickled, expires)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._key(key, version)
+        expires = self._expiry(timeout)
+        self._l1_delete([name])
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (None if expires == FOREVER else expires, name, time.time()))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        self._l1_delete(names)
+        self._db.executemany('DELETE FROM cache WHERE key = ?',
+                             [(name,) for name in names])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self._db.execute('DELETE FROM cache')
+        self._db.execute('DELETE FROM locks')
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        """Значение ключа; если его нет, default() вычисляет ровно один
+        процесс. None из default() не кешируется."""
+        found = self.get_many([key], version)
+        if key in found:
+            return found[key]
+        name = self._key(key, version)
+        if self._acquire(name):
+            try:
+                value = default() if callable(default) else default
+                if value is not None:
+                    self.set(key, value, timeout, version)
+                return value
+            finally:
+                self._release(name)
+        stale = self._l2_get([name], stale=True)
+        if stale:
+            return pickle.loads(stale[name][0])
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            found = self.get_many([key], version)
+            if key in found:
+                return found[key]
+        return default() if callable(default) else default
+
+    def close(self, **kwargs):
+        # Соединение с L2 живёт весь поток: закрывать его после каждого
+        # запроса значило бы заново открывать файл и проверять схему.
+        pass
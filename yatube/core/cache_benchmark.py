@@ -0,0 +1,144 @@
+"""Сравнение бэкендов кеша под нагрузкой нескольких процессов.
+
+Каждый процесс-воркер читает ключи страниц с популярностью по закону
+Ципфа; при промахе он "строит" страницу (HTML заданного размера) и кладёт
+её в кеш. У локального кеша в памяти каждый процесс прогревается сам
+и хранит свою копию горячих страниц, общие кеши делят их между всеми.
+"""
+import itertools
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from bisect import bisect
+
+from django.utils.module_loading import import_string
+
+from tasks.stats import percentile
+
+
+WORDS = ('пост', 'группа', 'автор', 'комментарий', 'подписка', 'лента',
+         'yatube', 'страница', 'картинка', 'текст', 'дата', 'профиль')
+
+
+def backends(directory, capacity, slot_size):
+    """Настройки сравниваемых бэкендов с одинаковой ёмкостью в ключах."""
+    shm_root = '/dev/shm' if os.path.isdir('/dev/shm') else directory
+    return {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark',
+            'OPTIONS': {'MAX_ENTRIES': capacity},
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(directory, 'file'),
+            'OPTIONS': {'MAX_ENTRIES': capacity},
+        },
+        'tiered': {
+            'BACKEND': 'core.cache_backends.tiered.TieredCache',
+            'LOCATION': os.path.join(directory, 'tiered.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': capacity, 'L1_MAX_ENTRIES': 100},
+        },
+        'shm': {
+            'BACKEND': 'core.cache_backends.shm.SharedMemoryCache',
+            'LOCATION': os.path.join(shm_root,
+                                     f'yatube-benchmark-{os.getpid()}'),
+            'OPTIONS': {'SLOTS': capacity, 'SLOT_SIZE': slot_size},
+        },
+    }
+
+
+def create(settings):
+    params = {key: value for key, value in settings.items()
+              if key not in ('BACKEND', 'LOCATION')}
+    return import_string(settings['BACKEND'])(settings['LOCATION'], params)
+
+
+def page(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return '<article>' + ' '.join(words) + '</article>'
+
+
+def picker(rng, keys, zipf):
+    cumulative = list(itertools.accumulate(
+        1 / (rank ** zipf) for rank in range(1, keys + 1)))
+    return lambda: bisect(cumulative, rng.random() * cumulative[-1])
+
+
+def footprint(cache):
+    """Байты значений, которые этот процесс держит в своей памяти: у
+    LocMemCache это копия всего кеша, у TieredCache - только L1."""
+    if hasattr(cache, '_memory'):
+        return sum(len(pickled) for pickled, _ in cache._memory.values())
+    return sum(len(value) for value in getattr(cache, '_cache', {}).values())
+
+
+def worker(settings, operations, keys, zipf, value_size, seed, results):
+    rng = random.Random(seed)
+    cache = create(settings)
+    pick = picker(rng, keys, zipf)
+    # Страницы строятся заранее: замеряется только работа кеша.
+    pages = [page(rng, value_size) for _ in range(8)]
+    hits = 0
+    timings = []
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f'page:{pick()}'
+        begin = time.perf_counter()
+        value = cache.get(key)
+        if value is None:
+            cache.set(key, rng.choice(pages), 600)
+        else:
+            hits += 1
+        timings.append((time.perf_counter() - begin) * 1000)
+    results.put({'hits': hits, 'operations': operations,
+                 'seconds': time.perf_counter() - started,
+                 'timings': timings, 'memory': footprint(cache)})
+
+
+def run_backend(settings, processes, operations, keys, zipf, value_size):
+    create(settings).clear()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(
+        settings, operations, keys, zipf, value_size, number, results))
+        for number in range(processes)]
+    for process in workers:
+        process.start()
+    reports = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    timings = sorted(ms for report in reports for ms in report['timings'])
+    total = sum(report['operations'] for report in reports)
+    seconds = max(report['seconds'] for report in reports)
+    return {
+        'ops_per_s': round(total / seconds),
+        'hit_rate': round(sum(report['hits'] for report in reports) / total,
+                          3),
+        'p50_ms': round(percentile(timings, 0.5), 4),
+        'p95_ms': round(percentile(timings, 0.95), 4),
+        'process_memory_kb': round(
+            sum(report['memory'] for report in reports) / 1024),
+    }
+
+
+def run(names, processes=4, operations=5000, keys=2000, zipf=1.1,
+        value_size=20000, capacity=1000):
+    slot_size = 1 << (value_size.bit_length() + 1)
+    with tempfile.TemporaryDirectory() as directory:
+        configured = backends(directory, capacity, slot_size)
+        try:
+            return {name: run_backend(configured[name], processes,
+                                      operations, keys, zipf, value_size)
+                    for name in names}
+        finally:
+            shm = configured['shm']['LOCATION']
+            if os.path.exists(shm):
+                os.remove(shm)
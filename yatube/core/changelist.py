@@ -0,0 +1,149 @@
+"""Списки объектов в админке на таблицах в миллионы строк.
+
+Стандартный список в админке на каждой странице считает COUNT(*) по всей
+таблице (и ещё раз - без фильтров), а иерархия дат собирает годы
+и месяцы через SELECT DISTINCT по всем строкам. LargeTableAdmin
+заменяет это операциями, стоимость которых не зависит от размера
+таблицы:
+
+- без фильтров число строк оценивается (reltuples в PostgreSQL,
+  MAX(pk) в остальных базах) и уточняется, когда страница оказывается
+  последней; с фильтрами считается не дальше COUNT_LIMIT строк;
+- годы, месяцы и дни иерархии дат ищутся пробами EXISTS по индексу
+  поля даты, по одной на период между первой и последней датой;
+- поля из list_deferred в список не загружаются.
+
+Связанные объекты колонок подтягивает list_select_related самого
+ModelAdmin, а внешние ключи в формах лучше показывать через
+raw_id_fields или autocomplete_fields, а не <select> со всеми строками.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+# Таблицы меньше этого считаются точно: там COUNT(*) дешевле ошибки.
+ESTIMATE_FROM = getattr(settings, 'ADMIN_ESTIMATE_FROM', 10000)
+COUNT_LIMIT = getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+
+
+def estimated_count(model, using):
+    """Примерное число строк таблицы модели без её обхода или None."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                           [model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+    if not isinstance(model._meta.pk, models.AutoField):
+        return None
+    # Поиск максимума по первичному ключу - один спуск по B-дереву.
+    # Удалённые строки оценку завышают, а не занижают.
+    return model._base_manager.using(using).aggregate(
+        last=models.Max('pk'))['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, models.QuerySet):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_FROM:
+                self.estimated = True
+                return estimate
+            return super().count
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+    def page(self, number):
+        page = super().page(number)
+        if not self.estimated or len(page) == self.per_page:
+            return page
+        # Неполная страница - последняя: оценка завышена удалёнными
+        # строками. За пустой страницей конец неизвестен, и строки
+        # считаются точно - так бывает, только если перейти за него.
+        if len(page):
+            self._correct((page.number - 1) * self.per_page + len(page))
+            return page
+        self._correct(self.object_list.count())
+        return super().page(self.num_pages)
+
+    def _correct(self, count):
+        self.estimated = False
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+
+
+class DeferredChangeList(ChangeList):
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        deferred = self.model_admin.list_deferred
+        return queryset.defer(*deferred) if deferred else queryset
+
+    def get_results(self, request):
+        super().get_results(request)
+        # Страница могла уточнить оценку числа строк и сдвинуться на
+        # настоящую последнюю (EstimatedCountPaginator.page).
+        self.result_count = self.paginator.count
+        self.multi_page = self.result_count > self.list_per_page
+        self.page_num = min(self.page_num, self.paginator.num_pages - 1)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'core/admin/change_list.html'
+    list_deferred = ()
+
+    def get_changelist(self, request, **kwargs):
+        return DeferredChangeList
+
+
+def next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1, month=1, day=1)
+    if kind == 'month':
+        return (start.replace(day=1)
+                + datetime.timedelta(days=32)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+
+def _bound(field, day):
+    if not isinstance(field, models.DateTimeField):
+        return day
+    moment = datetime.datetime.combine(day, datetime.time())
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def existing_periods(queryset, field_name, kind, start, stop):
+    """Начала периодов kind ('year', 'month' или 'day') от даты start
+    до даты stop (не включая её), в которых есть записи queryset."""
+    field = queryset.model._meta.get_field(field_name)
+    found = []
+    while start < stop:
+        following = next_period(start, kind)
+        if queryset.filter(**{
+                f'{field_name}__gte': _bound(field, start),
+                f'{field_name}__lt': _bound(field, following)}).exists():
+            found.append(start)
+        start = following
+    return found
+
+
+def local_date(value):
+    if isinstance(value, datetime.datetime):
+        if settings.USE_TZ and timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
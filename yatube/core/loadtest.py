@@ -0,0 +1,260 @@
+"""Нагрузочный прогон приложения целиком, без внешних сервисов.
+
+Сервер - yatube.wsgi, запущенный в нескольких процессах wsgiref, которые
+делят один слушающий сокет (pre-fork); каждый процесс обрабатывает
+запросы в потоках. Клиенты - потоки с http.client, которые от имени
+заранее залогиненных пользователей выполняют смесь чтений и записей.
+"""
+import http.client
+import logging
+import multiprocessing
+import random
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from posts.models import Group, Post, User
+from tasks.stats import percentile
+
+
+# Верхние границы корзин гистограммы задержек, мс.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+MIX = {'index': 35, 'group': 10, 'profile': 10, 'detail': 15,
+       'follow_feed': 10, 'follow': 5, 'comment': 10, 'create': 5}
+POOL_SIZE = 1000
+OK_STATUSES = (200, 302)
+
+
+def parse_mix(text):
+    """'index=50,comment=5' -> {'index': 50, 'comment': 5}."""
+    mix = {}
+    for part in filter(None, text.split(',')):
+        action, _, weight = part.partition('=')
+        if action not in MIX:
+            raise ValueError(f'Неизвестное действие {action}')
+        mix[action] = int(weight)
+    return mix
+
+
+def histogram(timings):
+    """Число запросов по корзинам BUCKETS; None - дольше последней."""
+    counts = Counter()
+    for ms in timings:
+        counts[next((bound for bound in BUCKETS if ms <= bound), None)] += 1
+    return [(bound, counts[bound]) for bound in BUCKETS + (None,)]
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _LockCounter(logging.Handler):
+    """Считает ответы 500 из-за блокировки SQLite ('database is locked')."""
+
+    def __init__(self, shared):
+        super().__init__()
+        self.shared = shared
+
+    def emit(self, record):
+        error = record.exc_info[1] if record.exc_info else None
+        if isinstance(error, OperationalError) and 'locked' in str(error):
+            with self.shared.get_lock():
+                self.shared.value += 1
+
+
+def _serve(listener, locks):
+    from yatube.wsgi import application
+    logging.getLogger('django.request').addHandler(_LockCounter(locks))
+    server = _Server(listener.getsockname(), _QuietHandler,
+                     bind_and_activate=False)
+    server.socket = listener
+    server.server_name, server.server_port = listener.getsockname()
+    server.setup_environ()
+    server.set_app(application)
+    server.serve_forever()
+
+
+def start_servers(workers, port=0):
+    """Запускает процессы сервера на общем сокете.
+
+    Возвращает (порт, процессы, общий счётчик блокировок SQLite).
+    """
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(128)
+    port = listener.getsockname()[1]
+    locks = multiprocessing.Value('i', 0)
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_serve, args=(listener, locks),
+                                 daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    listener.close()
+    return port, processes, locks
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def session_cookies(user):
+    client = Client()
+    client.force_login(user)
+    return {settings.SESSION_COOKIE_NAME:
+            client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: get_random_string(32)}
+
+
+class Pools:
+    """Случайные выборки объектов, по которым ходят клиенты."""
+
+    def __init__(self, users, rng):
+        self.post_ids = self.sample(
+            Post.objects.values_list('pk', flat=True), rng)
+        self.usernames = self.sample(
+            User.objects.values_list('username', flat=True), rng)
+        self.slugs = self.sample(
+            Group.objects.values_list('slug', flat=True), rng)
+        readers = User.objects.filter(pk__in=self.sample(
+            User.objects.values_list('pk', flat=True), rng, users))
+        self.sessions = [session_cookies(user) for user in readers]
+
+    @staticmethod
+    def sample(values, rng, size=POOL_SIZE):
+        values = list(values)
+        return rng.sample(values, min(size, len(values)))
+
+
+class LoadTest:
+    def __init__(self, port, pools, mix, seed=0):
+        self.port = port
+        self.pools = pools
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.seed = seed
+
+    def target(self, action, rng):
+        """(метод, путь, данные формы) для действия."""
+        if action == 'index':
+            return 'GET', reverse('posts:index'), None
+        if action == 'group':
+            return 'GET', reverse('posts:group_list', kwargs={
+                'slug': rng.choice(self.pools.slugs)}), None
+        if action == 'profile':
+            return 'GET', reverse('posts:profile', kwargs={
+                'username': rng.choice(self.pools.usernames)}), None
+        if action == 'follow_feed':
+            return 'GET', reverse('posts:follow_index'), None
+        if action == 'follow':
+            name = rng.choice(('posts:profile_follow',
+                               'posts:profile_unfollow'))
+            return 'GET', reverse(name, kwargs={
+                'username': rng.choice(self.pools.usernames)}), None
+        if action == 'create':
+            return 'POST', reverse('posts:post_create'), {
+                'text': f'нагрузочный пост {rng.random()}'}
+        post_id = rng.choice(self.pools.post_ids)
+        if action == 'comment':
+            return 'POST', reverse('posts:add_comment', kwargs={
+                'post_id': post_id}), {'text': 'нагрузочный комментарий'}
+        return 'GET', reverse('posts:post_detail', kwargs={
+            'post_id': post_id}), None
+
+    def send(self, method, path, data, cookies):
+        headers = {'Cookie': '; '.join(
+            f'{name}={value}' for name, value in cookies.items())}
+        body = None
+        if data is not None:
+            data['csrfmiddlewaretoken'] = cookies[settings.CSRF_COOKIE_NAME]
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection('127.0.0.1', self.port,
+                                                timeout=60)
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def client(self, number, deadline, budget, samples):
+        rng = random.Random(self.seed + number)
+        cookies = self.pools.sessions[number % len(self.pools.sessions)]
+        while time.monotonic() < deadline and budget.acquire(False):
+            action = rng.choices(self.actions, self.weights)[0]
+            method, path, data = self.target(action, rng)
+            started = time.perf_counter()
+            try:
+                status = self.send(method, path, data, cookies)
+            except OSError:
+                status = None
+            samples.append((action, (time.perf_counter() - started) * 1000,
+                            status in OK_STATUSES))
+
+    def run(self, clients, duration, requests=0):
+        """Гоняет клиентов duration секунд (или до requests запросов)."""
+        budget = threading.Semaphore(requests or 2 ** 30)
+        deadline = time.monotonic() + duration
+        samples = [[] for _ in range(clients)]
+        threads = [threading.Thread(target=self.client,
+                                    args=(number, deadline, budget,
+                                          samples[number]))
+                   for number in range(clients)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        return summarize([sample for part in samples for sample in part],
+                         elapsed)
+
+
+def timings_summary(timings):
+    timings = sorted(timings)
+    return {'p50_ms': round(percentile(timings, 0.5) or 0, 3),
+            'p95_ms': round(percentile(timings, 0.95) or 0, 3),
+            'p99_ms': round(percentile(timings, 0.99) or 0, 3)}
+
+
+def summarize(samples, elapsed):
+    by_action = defaultdict(list)
+    errors = Counter()
+    for action, ms, ok in samples:
+        by_action[action].append(ms)
+        errors[action] += not ok
+    total = len(samples)
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 3),
+        'rps': round(total / elapsed, 2) if elapsed else 0,
+        'errors': sum(errors.values()),
+        'error_rate': round(sum(errors.values()) / total, 4) if total else 0,
+        'latency': timings_summary(ms for _, ms, _ in samples),
+        'histogram': histogram(ms for _, ms, _ in samples),
+        'actions': {action: dict(count=len(timings), errors=errors[action],
+                                 **timings_summary(timings))
+                    for action, timings in sorted(by_action.items())},
+    }
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import admin_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число запросов и размер ответа списков '
+            'постов, комментариев и подписок в админке')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*',
+                            help='Имена замеров, например posts_post')
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        dataset = admin_benchmark.dataset_size()
+        self.stdout.write(', '.join(f'{name}: ~{rows}'
+                                    for name, rows in dataset.items()))
+        results = admin_benchmark.run(options['iterations'],
+                                      options['warmup'], options['only'])
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:24} '
+                f'p50 {metrics["p50_ms"]:8.2f} ms  '
+                f'p95 {metrics["p95_ms"]:8.2f} ms  '
+                f'{metrics["queries"]:3} запр.  '
+                f'{metrics["bytes"]:7} байт  [{metrics["status"]}]')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'dataset': dataset,
+                           'iterations': options['iterations'],
+                           'results': results}, file, indent=2)
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import cache_benchmark
+
+
+BACKENDS = ('locmem', 'file', 'tiered', 'shm')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает бэкенды кеша (LocMemCache, файловый, двухуровневый '
+            'и в общей памяти) под нагрузкой нескольких процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(BACKENDS),
+                            choices=BACKENDS)
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=5000,
+                            help='Обращений к кешу в каждом процессе')
+        parser.add_argument('--keys', type=int, default=2000)
+        parser.add_argument('--zipf', type=float, default=1.1)
+        parser.add_argument('--value-size', type=int, default=20000,
+                            help='Размер страницы, символов')
+        parser.add_argument('--capacity', type=int, default=1000,
+                            help='Ёмкость кеша в ключах')
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        results = cache_benchmark.run(
+            options['backends'], options['processes'],
+            options['operations'], options['keys'], options['zipf'],
+            options['value_size'], options['capacity'])
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:8} {metrics["ops_per_s"]:8} оп/с  '
+                f'попаданий {metrics["hit_rate"]:6.1%}  '
+                f'p50 {metrics["p50_ms"]:7.3f} ms  '
+                f'p95 {metrics["p95_ms"]:7.3f} ms  '
+                f'в памяти процессов {metrics["process_memory_kb"]} КБ')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'options': {key: options[key] for key in (
+                    'processes', 'operations', 'keys', 'zipf',
+                    'value_size', 'capacity')}, 'results': results},
+                    file, indent=2)
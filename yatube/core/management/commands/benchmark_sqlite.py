@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import sqlite, sqlite_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения и записи SQLite '
+            'в разных профилях на копии базы; для замера всего '
+            'приложения используйте loadtest')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+',
+                            default=list(sqlite.PROFILES),
+                            choices=list(sqlite.PROFILES))
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Длительность замера профиля, секунды')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер возможен только для SQLite')
+        connection.ensure_connection()
+        try:
+            results = sqlite_benchmark.run(
+                connection.connection, options['profiles'],
+                options['readers'], options['writers'], options['duration'])
+        except ValueError as error:
+            raise CommandError(
+                f'{error}: сначала выполните manage.py generate_dataset')
+        for profile, actions in results.items():
+            for action, metrics in actions.items():
+                self.stdout.write(
+                    f'{profile:12} {action:6} '
+                    f'{metrics["ops_per_s"]:9.1f} оп/с  '
+                    f'p50 {metrics["p50_ms"]:8.2f} ms  '
+                    f'p95 {metrics["p95_ms"]:8.2f} ms  '
+                    f'блокировок {metrics["locked"]}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'readers': options['readers'],
+                           'writers': options['writers'],
+                           'duration': options['duration'],
+                           'results': results}, file, indent=2)
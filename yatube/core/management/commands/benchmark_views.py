@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmarks, budgets
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число запросов и размер ответа всех '
+            'страниц posts, users и about и проверяет их по бюджетам')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом')
+        parser.add_argument('--only', nargs='*',
+                            help='Имена страниц, например posts:index')
+        parser.add_argument('--output', help='Куда сохранить JSON')
+        parser.add_argument('--compare', help='JSON прошлого прогона')
+        parser.add_argument('--budgets', default=budgets.BUDGETS,
+                            help='JSON с бюджетами; "" - не проверять')
+
+    def handle(self, *args, **options):
+        objects = benchmarks.sample_objects()
+        if objects is None:
+            raise CommandError(
+                'База пуста: сначала выполните manage.py generate_dataset')
+        results = benchmarks.run(objects, options['iterations'],
+                                 options['warmup'], options['cold'],
+                                 options['only'])
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'dataset': benchmarks.dataset_size(),
+                           'iterations': options['iterations'],
+                           'cold': options['cold'],
+                           'results': results}, file, indent=2)
+        if options['compare']:
+            self.report_changes(budgets.load(options['compare']),
+                                results)
+        limits = budgets.load_budgets(options['budgets'])
+        if limits:
+            self.check_budgets(results, limits)
+
+    def report(self, results):
+        for name, kinds in results.items():
+            for kind, metrics in kinds.items():
+                self.stdout.write(
+                    f'{name:32} {kind:13} '
+                    f'p50 {metrics["p50_ms"]:8.2f} ms  '
+                    f'p95 {metrics["p95_ms"]:8.2f} ms  '
+                    f'p99 {metrics["p99_ms"]:8.2f} ms  '
+                    f'{metrics["queries"]:3} запр.  '
+                    f'{metrics["bytes"]:7} байт  [{metrics["status"]}]')
+
+    def report_changes(self, previous, results):
+        for name, kind, metric, before, after in benchmarks.compare(
+                previous['results'], results):
+            self.stdout.write(f'{name} {kind} {metric}: {before} -> {after}')
+
+    def check_budgets(self, results, limits):
+        failed = benchmarks.violations(results, limits)
+        for name, kind, metric, value, limit in failed:
+            self.stderr.write(
+                f'{name} {kind}: {metric} = {value}, бюджет {limit}')
+        if failed:
+            raise CommandError(f'Превышено бюджетов: {len(failed)}')
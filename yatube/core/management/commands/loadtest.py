@@ -0,0 +1,71 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = ('Запускает приложение в нескольких процессах и нагружает его '
+            'смесью чтений и записей от имени разных пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Процессов сервера')
+        parser.add_argument('--clients', type=int, default=16,
+                            help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Длительность, секунды')
+        parser.add_argument('--requests', type=int, default=0,
+                            help='Остановиться после стольких запросов')
+        parser.add_argument('--users', type=int, default=50,
+                            help='Сколько пользователей залогинить')
+        parser.add_argument('--mix', default='',
+                            help='Веса действий, например index=50,create=5')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--port', type=int, default=0)
+        parser.add_argument('--output', help='Куда сохранить JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mix = dict(loadtest.MIX, **loadtest.parse_mix(options['mix']))
+        except ValueError as error:
+            raise CommandError(error)
+        pools = loadtest.Pools(options['users'], random.Random(
+            options['seed']))
+        if not (pools.post_ids and pools.sessions):
+            raise CommandError(
+                'База пуста: сначала выполните manage.py generate_dataset')
+        if not pools.slugs:
+            mix.pop('group')
+        port, processes, locks = loadtest.start_servers(options['workers'],
+                                                        options['port'])
+        try:
+            result = loadtest.LoadTest(port, pools, mix, options['seed']).run(
+                options['clients'], options['duration'], options['requests'])
+        finally:
+            loadtest.stop_servers(processes)
+        result['sqlite_locked'] = locks.value
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, indent=2)
+
+    def report(self, result):
+        self.stdout.write(
+            f'Запросов: {result["requests"]} за {result["seconds"]} с, '
+            f'{result["rps"]} в секунду; ошибок: {result["errors"]} '
+            f'({result["error_rate"]:.2%}); блокировок SQLite: '
+            f'{result["sqlite_locked"]}')
+        for action, stats in result['actions'].items():
+            self.stdout.write(
+                f'{action:12} {stats["count"]:7} запр. '
+                f'{stats["errors"]:5} ош.  p50 {stats["p50_ms"]:8.2f} ms  '
+                f'p95 {stats["p95_ms"]:8.2f} ms  '
+                f'p99 {stats["p99_ms"]:8.2f} ms')
+        top = max(count for _, count in result['histogram']) or 1
+        for bound, count in result['histogram']:
+            label = f'<= {bound} ms' if bound else '> 5000 ms'
+            self.stdout.write(
+                f'{label:>11} {count:7} {"#" * (40 * count // top)}')
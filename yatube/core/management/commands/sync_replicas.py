@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.routers import PRIMARY, replicas
+from core.sqlite import copy_database
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик из '
+            'DATABASE_REPLICAS (YATUBE_REPLICAS)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Повторять каждые N секунд, изображая '
+                                 'отставание реплик')
+
+    def handle(self, *args, **options):
+        aliases = replicas()
+        if not aliases:
+            raise CommandError('Реплики не настроены: задайте YATUBE_REPLICAS')
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копировать можно только базу SQLite')
+        while True:
+            primary.ensure_connection()
+            for alias in aliases:
+                started = time.perf_counter()
+                copy_database(primary.connection,
+                              connections[alias].settings_dict['NAME'])
+                self.stdout.write(
+                    f'{alias}: скопировано за '
+                    f'{time.perf_counter() - started:.2f} с')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,134 @@
+"""Учёт SQL-запросов по страницам.
+
+QueryInstrumentationMiddleware включается настройкой QUERY_INSTRUMENTATION.
+Для каждого запроса она считает число и суммарное время SQL, повторы
+одного и того же запроса (признак N+1) и самые медленные выражения,
+пишет строку JSON в логгер yatube.queries и копит скользящую сводку
+по именам страниц (posts:index, posts:profile, ...), которую показывает
+core.views.query_stats.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from tasks.stats import percentile
+
+from . import budgets
+
+
+logger = logging.getLogger('yatube.queries')
+
+WINDOW = getattr(settings, 'QUERY_INSTRUMENTATION_WINDOW', 500)
+SLOWEST = 3
+# Запросы без подходящего адреса (404, сканеры) копятся под одним
+# ключом, иначе каждый новый путь заводил бы свою запись в сводке.
+UNRESOLVED = '<unresolved>'
+# С какого числа одинаковых запросов (с разными параметрами) это N+1.
+REPEATS = 3
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, repr(params), (time.perf_counter() - started) * 1000))
+
+    def report(self):
+        statements = Counter(sql for sql, _, _ in self.queries)
+        exact = Counter((sql, params) for sql, params, _ in self.queries)
+        slowest = sorted(self.queries, key=lambda query: -query[2])
+        return {
+            'queries': len(self.queries),
+            'time_ms': round(sum(ms for _, _, ms in self.queries), 3),
+            'duplicates': sum(count - 1 for count in exact.values()),
+            'repeated': [{'sql': sql, 'count': count}
+                         for sql, count in statements.most_common()
+                         if count >= REPEATS],
+            'slowest': [{'sql': sql, 'ms': round(ms, 3)}
+                        for sql, _, ms in slowest[:SLOWEST]],
+        }
+
+
+class QueryStats:
+    """Скользящая сводка последних WINDOW запросов к каждой странице."""
+
+    def __init__(self, window=WINDOW):
+        self.lock = threading.Lock()
+        self.window = window
+        self.views = defaultdict(lambda: deque(maxlen=self.window))
+
+    def add(self, view, report):
+        with self.lock:
+            self.views[view].append((report['queries'], report['time_ms'],
+                                     report['duplicates']))
+
+    def summary(self):
+        with self.lock:
+            views = {view: list(samples)
+                     for view, samples in self.views.items()}
+        result = {}
+        for view, samples in sorted(views.items()):
+            counts = sorted(queries for queries, _, _ in samples)
+            times = sorted(ms for _, ms, _ in samples)
+            result[view] = {
+                'requests': len(samples),
+                'queries_p50': percentile(counts, 0.5),
+                'queries_max': counts[-1],
+                'time_p50_ms': percentile(times, 0.5),
+                'time_p95_ms': percentile(times, 0.95),
+                'duplicates': sum(dups for _, _, dups in samples),
+            }
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+stats = QueryStats()
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = budgets.load_budgets()
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            elapsed = (time.perf_counter() - started) * 1000
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED
+        kind = (budgets.AUTHENTICATED if getattr(request, 'user', None)
+                and request.user.is_authenticated else budgets.ANONYMOUS)
+        report = recorder.report()
+        budget = budgets.budget_for(self.budgets, view, kind).get('queries')
+        report.update(view=view, path=request.path,
+                      method=request.method, user=kind,
+                      status=response.status_code,
+                      response_ms=round(elapsed, 3), budget=budget,
+                      over_budget=(budget is not None
+                                   and report['queries'] > budget))
+        stats.add(view, report)
+        logger.log(logging.WARNING if report['over_budget'] else logging.INFO,
+                   json.dumps(report, ensure_ascii=False))
+        return response
@@ -0,0 +1,118 @@
+"""Чтение лент с реплик.
+
+ReplicaRouter отправляет чтения моделей REPLICA_APPS на реплики из
+settings.DATABASE_REPLICAS, только пока ReplicaRoutingMiddleware
+обрабатывает GET одной из страниц REPLICA_VIEWS; всё остальное, включая
+любые записи, идёт в default.
+После запроса, который что-то записал, клиент получает cookie и ещё
+REPLICA_PIN_SECONDS читает только с основной базы, чтобы сразу видеть
+свои изменения. Метод запроса неважен: подписка пишет по GET и
+перенаправляет на профиль, который иначе прочитался бы с реплики.
+То, что кешируется под текущей версией ленты, строится внутри
+primary(): реплика с задержкой иначе закрепила бы в кеше ленту без
+последних записей до следующего изменения. Локально репликами
+служат копии файла SQLite, которые обновляет manage.py sync_replicas.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+PRIMARY = 'default'
+REPLICA_VIEWS = getattr(settings, 'REPLICA_VIEWS', (
+    'posts:index', 'posts:group_list', 'posts:profile',
+    'posts:follow_index', 'posts:post_detail', 'posts:post_comments'))
+# Сессии, пользователи и очередь задач всегда читаются с основной базы:
+# только что созданная сессия может ещё не дойти до реплики.
+REPLICA_APPS = getattr(settings, 'REPLICA_APPS', ('posts',))
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+PIN_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def reading_replicas():
+    return getattr(_state, 'replicas', False)
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+@contextmanager
+def primary():
+    """Чтения внутри блока идут в основную базу."""
+    previous = reading_replicas()
+    _state.replicas = False
+    try:
+        yield
+    finally:
+        _state.replicas = previous
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if (not (aliases and reading_replicas()) or wrote()
+                or model._meta.app_label not in REPLICA_APPS):
+            return PRIMARY
+        # Связанные объекты читаются с той же реплики, что и сам объект.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in aliases:
+            return instance._state.db
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики - копии основной базы, миграции к ним не применяются.
+        return db not in replicas()
+
+
+def pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replicas = False
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            if wrote():
+                until = time.time() + REPLICA_PIN_SECONDS
+                response.set_cookie(PIN_COOKIE, f'{until:.0f}',
+                                    max_age=REPLICA_PIN_SECONDS,
+                                    httponly=True, samesite='Lax')
+            return response
+        finally:
+            _state.replicas = False
+            _state.wrote = False
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _state.replicas = (
+            request.method in SAFE_METHODS
+            and request.resolver_match.view_name in REPLICA_VIEWS
+            and not pinned(request))
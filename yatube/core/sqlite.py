@@ -0,0 +1,75 @@
+"""Профили настройки SQLite.
+
+Профиль - прагмы, которые выполняются на каждом новом соединении, режим
+начала транзакций и время жизни соединений. Модуль не зависит от
+django.conf, поэтому его можно импортировать из settings.py.
+"""
+import re
+import sqlite3
+
+
+PROFILES = {
+    # Поведение SQLite и Django по умолчанию; journal_mode задан явно,
+    # потому что режим WAL сохраняется в файле базы.
+    'plain': {
+        'pragmas': {'journal_mode': 'delete'},
+        'transaction_mode': 'DEFERRED',
+        'timeout': 5,
+        'conn_max_age': 0,
+    },
+    # WAL: читатели не ждут писателя; synchronous=NORMAL в WAL теряет при
+    # сбое питания только последние транзакции, но не портит базу.
+    # BEGIN IMMEDIATE берёт блокировку записи сразу, и ожидание решает
+    # busy_timeout, а не ошибка 'database is locked' при повышении
+    # блокировки посреди транзакции.
+    'production': {
+        'pragmas': {
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 20000,
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'temp_store': 'memory',
+        },
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+        'conn_max_age': 60,
+    },
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+PRAGMA = re.compile(r'\w+')
+VALUE = re.compile(r'-?\w+')
+
+
+def database_settings(name, profile='production'):
+    """Запись для settings.DATABASES с движком core.backends.sqlite3."""
+    options = PROFILES[profile]
+    return {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': options['conn_max_age'],
+        'OPTIONS': {
+            'timeout': options['timeout'],
+            'pragmas': dict(options['pragmas']),
+            'transaction_mode': options['transaction_mode'],
+        },
+    }
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет прагмы на соединении sqlite3; имена и значения
+    проверяются, потому что PRAGMA не принимает параметров запроса."""
+    for name, value in pragmas.items():
+        if not PRAGMA.fullmatch(name) or not VALUE.fullmatch(str(value)):
+            raise ValueError(f'Недопустимая прагма {name} = {value}')
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def copy_database(source, path):
+    """Копирует открытое соединение sqlite3 (в том числе базу в памяти)
+    в файл path."""
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,132 @@
+"""Сравнение профилей SQLite на копии базы.
+
+Для каждого профиля из core.sqlite.PROFILES база копируется во временный
+файл, и на копии одновременно работают потоки-читатели (страница ленты)
+и потоки-писатели (комментарий и счётчик поста в одной транзакции, как
+add_comment). Профиль с conn_max_age = 0 открывает соединение на каждую
+операцию - так ведёт себя Django без CONN_MAX_AGE.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from tasks.stats import percentile
+
+from .sqlite import PROFILES, apply_pragmas, copy_database
+
+
+FEED = ('SELECT p.id, p.text, p.pub_date, u.username FROM posts_post p '
+        'JOIN auth_user u ON u.id = p.author_id '
+        'ORDER BY p.pub_date DESC, p.id DESC LIMIT 10')
+COUNT = 'SELECT comments_count FROM posts_post WHERE id = ?'
+COMMENT = ('INSERT INTO posts_comment (post_id, author_id, text, created) '
+           'VALUES (?, ?, ?, datetime(\'now\'))')
+COUNTER = ('UPDATE posts_post SET comments_count = comments_count + 1 '
+           'WHERE id = ?')
+
+
+def connect(path, profile):
+    options = PROFILES[profile]
+    connection = sqlite3.connect(path, timeout=options['timeout'],
+                                 isolation_level=None,
+                                 check_same_thread=False)
+    apply_pragmas(connection, options['pragmas'])
+    return connection
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, profile, deadline, action, ids):
+        super().__init__(daemon=True)
+        self.path = path
+        self.profile = profile
+        self.deadline = deadline
+        self.action = action
+        self.ids = ids
+        self.random = random.Random(id(self))
+        self.timings = []
+        self.locked = 0
+
+    def read(self, connection):
+        connection.execute(FEED).fetchall()
+
+    def write(self, connection):
+        post, author = self.random.choice(self.ids)
+        connection.execute(
+            f'BEGIN {PROFILES[self.profile]["transaction_mode"]}')
+        try:
+            connection.execute(COUNT, (post,)).fetchone()
+            connection.execute(COMMENT, (post, author, 'нагрузка'))
+            connection.execute(COUNTER, (post,))
+            connection.execute('COMMIT')
+        except sqlite3.Error:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+
+    def run(self):
+        reuse = PROFILES[self.profile]['conn_max_age'] != 0
+        connection = connect(self.path, self.profile) if reuse else None
+        operation = getattr(self, self.action)
+        while time.monotonic() < self.deadline:
+            started = time.perf_counter()
+            current = connection or connect(self.path, self.profile)
+            try:
+                operation(current)
+            except sqlite3.OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                self.locked += 1
+                continue
+            finally:
+                if current is not connection:
+                    current.close()
+            self.timings.append((time.perf_counter() - started) * 1000)
+        if connection is not None:
+            connection.close()
+
+
+def metrics(workers, duration):
+    timings = sorted(ms for worker in workers for ms in worker.timings)
+    return {
+        'ops': len(timings),
+        'ops_per_s': round(len(timings) / duration, 1),
+        'p50_ms': round(percentile(timings, 0.5) or 0, 3),
+        'p95_ms': round(percentile(timings, 0.95) or 0, 3),
+        'locked': sum(worker.locked for worker in workers),
+    }
+
+
+def run_profile(source, profile, readers=4, writers=2, duration=5):
+    """Замер одного профиля на свежей копии базы source."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        copy_database(source, path)
+        setup = connect(path, profile)
+        ids = setup.execute(
+            'SELECT id, author_id FROM posts_post LIMIT 1000').fetchall()
+        setup.close()
+        if not ids:
+            raise ValueError('В базе нет постов')
+        deadline = time.monotonic() + duration
+        workers = {
+            'read': [Worker(path, profile, deadline, 'read', ids)
+                     for _ in range(readers)],
+            'write': [Worker(path, profile, deadline, 'write', ids)
+                      for _ in range(writers)],
+        }
+        for group in workers.values():
+            for worker in group:
+                worker.start()
+        for group in workers.values():
+            for worker in group:
+                worker.join()
+        return {action: metrics(group, duration)
+                for action, group in workers.items()}
+
+
+def run(source, profiles, readers=4, writers=2, duration=5):
+    return {profile: run_profile(source, profile, readers, writers, duration)
+            for profile in profiles}
@@ -0,0 +1,102 @@
+"""Хранилище файлов, адресуемое содержимым.
+
+Загруженный файл получает имя по SHA-256 своего содержимого:
+upload_to/ab/abcdef...ext. Повторная загрузка той же картинки (репост,
+правка поста) ничего не пишет на диск и получает то же имя, а значит и
+готовые миниатюры. Поэтому один файл могут делить несколько записей:
+удалять его можно только через release(), когда ссылок на него не
+осталось. Повторная загрузка и release() проверяют файл под одной
+блокировкой, поэтому release() не удалит файл, на который только что
+сослалась новая загрузка.
+
+Содержимое по такому имени никогда не меняется, и core.views.serve_media
+отдаёт его с заголовками вечного кеширования (при SERVE_MEDIA). Если
+media отдаёт веб-сервер, заголовок ставит его правило, например nginx:
+
+    location ~ "^/media/(.+/)?[0-9a-f]{32,}[^/]*$" {
+        root /path/to/yatube;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+"""
+import hashlib
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from fcntl import LOCK_EX, LOCK_UN, lockf
+
+from django.core.files.storage import FileSystemStorage
+
+
+# Последний компонент пути начинается с хеша: файлы этого хранилища,
+# миниатюры sorl и варианты картинок.
+HASHED = re.compile(r'(^|/)[0-9a-f]{32,}[^/]*$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# Файл, на который только что сослалась новая загрузка, не удаляется:
+# запись с ним могла ещё не закоммититься.
+RELEASE_GRACE = 60 * 60
+
+
+def is_hashed(name):
+    return bool(HASHED.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    @contextmanager
+    def _lock(self):
+        """Блокировка повторных загрузок и release() между процессами."""
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, '.release.lock'), 'a') as file:
+            lockf(file, LOCK_EX)
+            try:
+                yield
+            finally:
+                lockf(file, LOCK_UN)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        hexdigest = digest.hexdigest()
+        return os.path.join(directory, hexdigest[:2],
+                            hexdigest + extension).replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяет содержимое, а не порядок загрузок.
+        return name
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        with self._lock():
+            if self.exists(name):
+                # Продлеваем файлу отсрочку удаления (см. release).
+                os.utime(self.path(name))
+                return name
+        # Файл пишется под временным именем и переименовывается целиком:
+        # параллельные загрузки одного содержимого не мешают друг другу.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def release(self, name, referenced):
+        """Удаляет файл name, если referenced() говорит, что ссылок на
+        него нет, и его давно не загружали повторно. Возвращает True,
+        если файл удалён."""
+        if not name or not self.exists(name) or self._fresh(name):
+            return False
+        if referenced():
+            return False
+        # Пока шла проверка ссылок, файл могли загрузить снова.
+        with self._lock():
+            if not self.exists(name) or self._fresh(name):
+                return False
+            self.delete(name)
+        return True
+
+    def _fresh(self, name):
+        age = time.time() - os.path.getmtime(self.path(name))
+        return age < RELEASE_GRACE
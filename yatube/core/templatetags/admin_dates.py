@@ -0,0 +1,88 @@
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.db.models import Max, Min
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from core.changelist import existing_periods, local_date, next_period
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def indexed_date_hierarchy(cl):
+    """Иерархия дат как у {% date_hierarchy %}, но периоды ищутся пробами
+    по индексу (core.changelist.existing_periods), а не DISTINCT по всем
+    строкам списка."""
+    field_name = cl.date_hierarchy
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    # Неверные год и месяц ChangeList отклоняет раньше, чем дойдёт до
+    # шаблона.
+    year = cl.params.get(year_field)
+    month = cl.params.get(month_field)
+    if cl.params.get(day_field):
+        # Выбран день: периоды искать не нужно.
+        return date_hierarchy(cl)
+
+    queryset = probe_queryset(cl)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    if not year:
+        # MIN и MAX в одном запросе SQLite считает обходом всей таблицы,
+        # а по отдельности - спуском по индексу.
+        first = cl.queryset.aggregate(first=Min(field_name))['first']
+        if first is None:
+            return {'show': True, 'back': None, 'choices': []}
+        last = cl.queryset.aggregate(last=Max(field_name))['last']
+        first, last = local_date(first), local_date(last)
+        if first.year != last.year:
+            years = existing_periods(
+                queryset, field_name, 'year',
+                first.replace(month=1, day=1), next_period(last, 'year'))
+            return {'show': True, 'back': None, 'choices': [{
+                'link': link({year_field: str(start.year)}),
+                'title': str(start.year),
+            } for start in years]}
+        year = first.year
+        if first.month == last.month:
+            month = first.month
+    if month:
+        start = datetime.date(int(year), int(month), 1)
+        days = existing_periods(queryset, field_name, 'day', start,
+                                next_period(start, 'month'))
+        return {'show': True, 'back': {
+            'link': link({year_field: year}), 'title': str(year),
+        }, 'choices': [{
+            'link': link({year_field: year, month_field: month,
+                          day_field: start.day}),
+            'title': capfirst(formats.date_format(start, 'MONTH_DAY_FORMAT')),
+        } for start in days]}
+    start = datetime.date(int(year), 1, 1)
+    months = existing_periods(queryset, field_name, 'month', start,
+                              next_period(start, 'year'))
+    return {'show': True, 'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [{
+                'link': link({year_field: year, month_field: start.month}),
+                'title': capfirst(formats.date_format(start,
+                                                      'YEAR_MONTH_FORMAT')),
+            } for start in months]}
+
+
+def probe_queryset(cl):
+    """Записи, в которых ищутся периоды. Период пробы лежит внутри
+    выбранного года или месяца, так что фильтр иерархии в пробах лишний,
+    а мешает он сильно: из двух диапазонов по одному полю SQLite
+    ограничивает обход индекса только одним."""
+    hierarchy = {f'{cl.date_hierarchy}__{part}'
+                 for part in ('year', 'month', 'day')}
+    if cl.query or set(cl.get_filters_params()) - hierarchy:
+        return cl.queryset
+    return cl.root_queryset
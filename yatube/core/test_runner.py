@@ -0,0 +1,39 @@
+"""Отдельный кеш для тестов.
+
+Тесты (manage.py test через TemporaryCacheRunner и pytest через
+conftest.py в корне репозитория) работают со своим пустым кешем во
+временном каталоге: общий файл кеша они читали бы и засоряли страницами
+тестовой базы. Каталог создаётся перед тестами и удаляется после них.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_cache():
+    """Кеши из settings.CACHES с LOCATION во временном каталоге."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    caches = {alias: {**options, 'LOCATION': os.path.join(directory, alias)}
+              for alias, options in settings.CACHES.items()}
+    try:
+        with override_settings(CACHES=caches):
+            yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache = temporary_cache()
+        self._cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,549 @@
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.forms import ValidationError
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import resolve, reverse
+from posts.models import Comment, Follow, Group, Post
+from PIL import Image
+from . import (benchmarks, loadtest, routers, sqlite, storage, uploads,
+               views)
+from .cache_backends.shm import SharedMemoryCache
+from .cache_backends.tiered import TieredCache
+from .middleware import UNRESOLVED, QueryRecorder, stats
+
+User = get_user_model()
+
+
+class BenchmarkViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='группа', slug='group',
+                                         description='описание')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='пост для замеров')
+        Comment.objects.create(post=cls.post, author=cls.author,
+                               text='комментарий')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name, content=None):
+        path = os.path.join(self.directory.name, name)
+        if content is not None:
+            with open(path, 'w') as file:
+                json.dump(content, file)
+        return path
+
+    def benchmark(self, **options):
+        call_command('benchmark_views', iterations=1, warmup=0,
+                     stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_every_route_is_measured(self):
+        """Замеряются все маршруты posts, users и about, кроме тех, что
+        пишут по GET."""
+        names = [name for name, _ in benchmarks.cases(
+            benchmarks.sample_objects())]
+        self.assertIn('posts:post_detail', names)
+        self.assertIn('users:password_reset_confirm', names)
+        self.assertIn('about:tech', names)
+        for name in benchmarks.WRITING_ROUTES:
+            self.assertNotIn(name, names)
+        output = self.path('results.json')
+        self.benchmark(output=output, budgets='')
+        with open(output) as file:
+            results = json.load(file)['results']
+        self.assertEqual(sorted(results), sorted(names))
+        detail = results['posts:post_detail']['anonymous']
+        self.assertEqual(detail['status'], 200)
+        self.assertGreater(detail['queries'], 0)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_budget_violation_fails_the_run(self):
+        """Превышение бюджета запросов завершает прогон ошибкой."""
+        budgets = self.path('budgets.json',
+                            {'posts:post_detail': {'queries': 0}})
+        with self.assertRaises(CommandError):
+            self.benchmark(only=['posts:post_detail'], budgets=budgets)
+        relaxed = self.path('relaxed.json',
+                            {'posts:post_detail': {'queries': 100}})
+        self.benchmark(only=['posts:post_detail'], budgets=relaxed)
+
+
+class LoadTestHelpersTest(TestCase):
+    def test_mix_parsing(self):
+        """Веса действий читаются из строки, неизвестные отвергаются."""
+        self.assertEqual(loadtest.parse_mix('index=50,comment=5'),
+                         {'index': 50, 'comment': 5})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('delete=1')
+
+    def test_histogram_buckets(self):
+        """Задержки попадают в ближайшую сверху корзину."""
+        buckets = dict(loadtest.histogram([0.5, 1, 3, 7000]))
+        self.assertEqual(buckets[1], 2)
+        self.assertEqual(buckets[5], 1)
+        self.assertEqual(buckets[None], 1)
+        self.assertEqual(sum(buckets.values()), 4)
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+class QueryInstrumentationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='пост')
+
+    def setUp(self):
+        stats.clear()
+
+    def test_request_is_logged_with_view_name(self):
+        """На каждый запрос пишется строка JSON с именем страницы."""
+        with self.assertLogs('yatube.queries', 'INFO') as logs:
+            Client().get(reverse('posts:post_detail',
+                                 kwargs={'post_id': self.post.pk}))
+        report = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(report['view'], 'posts:post_detail')
+        self.assertGreater(report['queries'], 0)
+        self.assertEqual(report['user'], 'anonymous')
+        staff = Client()
+        staff.force_login(User.objects.create_user(username='staff',
+                                                   is_staff=True))
+        summary = staff.get(reverse('query_stats')).json()
+        self.assertEqual(summary['posts:post_detail']['requests'], 1)
+
+    def test_unresolved_paths_share_one_entry(self):
+        """Запросы к несуществующим адресам не раздувают сводку."""
+        client = Client()
+        for path in ('/wp-login.php', '/.env', '/admin.php'):
+            with self.assertLogs('yatube.queries', 'INFO') as logs:
+                client.get(path)
+            report = json.loads(logs.records[-1].getMessage())
+            self.assertEqual(report['path'], path)
+        self.assertEqual(list(stats.summary()), [UNRESOLVED])
+        self.assertEqual(stats.summary()[UNRESOLVED]['requests'],
+                         3)
+
+    def test_repeated_queries_are_reported(self):
+        """Одинаковые запросы с разными параметрами считаются N+1."""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for number in range(3):
+                list(Post.objects.filter(pk=number))
+            list(Post.objects.filter(pk=1))
+        report = recorder.report()
+        self.assertEqual(report['queries'], 4)
+        self.assertEqual(report['duplicates'], 1)
+        self.assertEqual(report['repeated'][0]['count'], 4)
+
+    def test_stats_are_hidden_from_guests(self):
+        """Гости не видят сводку, когда DEBUG выключен."""
+        response = Client().get(reverse('query_stats'))
+        self.assertEqual(response.status_code, 404)
+
+
+class SQLiteProfileTest(TransactionTestCase):
+    def test_pragmas_are_applied_to_connections(self):
+        """Прагмы профиля выполняются на соединении Django."""
+        pragmas = connection.settings_dict['OPTIONS'].get('pragmas', {})
+        if 'cache_size' not in pragmas:
+            self.skipTest('Профиль без cache_size')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], pragmas['cache_size'])
+
+    def test_unsafe_pragmas_are_rejected(self):
+        """Имя и значение прагмы не могут содержать SQL."""
+        with self.assertRaises(ValueError):
+            sqlite.apply_pragmas(connection.connection,
+                                 {'cache_size': '1; DROP TABLE posts_post'})
+
+    def test_benchmark_compares_profiles(self):
+        """Замер проходит для всех профилей, в production нет блокировок."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='пост')
+        output = io.StringIO()
+        call_command('benchmark_sqlite', duration=0.3, readers=1,
+                     writers=2, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2 * len(sqlite.PROFILES))
+        production = [line for line in lines
+                      if line.split()[:2] == ['production', 'write']]
+        self.assertIn('блокировок 0', production[0])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def route(self, method, url, cookies=None, write=False):
+        """Прогоняет запрос через ReplicaRoutingMiddleware и возвращает
+        базу, выбранную для чтения поста, и ответ."""
+        request = getattr(RequestFactory(), method)(url)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(url)
+        chosen = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Comment)
+            chosen.append(self.router.db_for_read(Post))
+            chosen.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        middleware = routers.ReplicaRoutingMiddleware(
+            lambda request: middleware.process_view(
+                request, view, (), {}) or view(request))
+        response = middleware(request)
+        return chosen, response
+
+    def test_feeds_are_read_from_replicas(self):
+        """Ленты читают посты с реплики, а пользователей - с основной
+        базы."""
+        chosen, _ = self.route('get', reverse('posts:index'))
+        self.assertEqual(chosen, ['replica', 'default'])
+
+    def test_other_requests_use_primary(self):
+        """Прочие страницы и POST читают с основной базы."""
+        chosen, _ = self.route('get', reverse('posts:post_create'))
+        self.assertEqual(chosen, ['default', 'default'])
+        chosen, _ = self.route('post', reverse('posts:index'))
+        self.assertEqual(chosen, ['default', 'default'])
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writer_is_pinned_to_primary(self):
+        """После записи чтения идут с основной базы, пока жива cookie."""
+        url = reverse('posts:add_comment', kwargs={'post_id': 1})
+        chosen, response = self.route('post', url, write=True)
+        self.assertEqual(chosen, ['default', 'default'])
+        cookie = response.cookies[routers.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], routers.REPLICA_PIN_SECONDS)
+        chosen, _ = self.route('get', reverse('posts:index'),
+                               {routers.PIN_COOKIE: cookie.value})
+        self.assertEqual(chosen, ['default', 'default'])
+        chosen, _ = self.route('get', reverse('posts:index'),
+                               {routers.PIN_COOKIE: '0'})
+        self.assertEqual(chosen, ['replica', 'default'])
+
+    def test_follow_pins_redirected_profile(self):
+        """Подписка пишет по GET и тоже закрепляет клиента за основной
+        базой: профиль после редиректа не читается с реплики."""
+        reader = User.objects.create_user('reader')
+        author = User.objects.create_user('writer')
+        self.client.force_login(reader)
+        response = self.client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': author.username}), follow=True)
+        self.assertIn(routers.PIN_COOKIE, self.client.cookies)
+        self.assertTrue(response.context['following'])
+
+    def test_replicas_are_not_migrated(self):
+        """Миграции применяются только к основной базе."""
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = self.backend()
+
+    def backend(self, **options):
+        options.setdefault('L2_ONLY', ['version:'])
+        return TieredCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_through_l2(self):
+        """Значение, записанное одним процессом, читает другой."""
+        self.cache.set('key', {'value': 1})
+        self.cache.set('short', 1, 0.2)
+        self.cache._memory.clear()
+        self.assertEqual(self.backend().get('key'), {'value': 1})
+        self.assertEqual(self.cache.get_many(['key', 'missing']),
+                         {'key': {'value': 1}})
+        time.sleep(0.3)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertTrue(self.cache.add('short', 2))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_l2_only_keys_skip_memory(self):
+        """Ключи из L2_ONLY не кешируются в памяти процесса."""
+        self.cache.set('version:index', 'a')
+        self.cache.set('page', 'b')
+        self.assertEqual(self.cache.get('version:index'), 'a')
+        stored = [key.split(':', 2)[-1] for key in self.cache._memory]
+        self.assertEqual(stored, ['page'])
+
+    def test_expired_key_is_rebuilt_once(self):
+        """Одновременные промахи по ключу пересчитывает один поток."""
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.backend().get_or_set('page', build, 60)))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['page'] * 8)
+
+    def test_stale_value_is_served_during_rebuild(self):
+        """Пока ключ пересчитывается, остальные получают старое значение."""
+        self.cache.set('page', 'old', 0.1)
+        time.sleep(0.2)
+        self.assertTrue(self.cache._acquire(self.cache.make_key('page')))
+        self.assertEqual(self.backend().get_or_set('page', 'new'), 'old')
+        self.cache._release(self.cache.make_key('page'))
+        self.assertEqual(self.backend().get_or_set('page', 'new'), 'new')
+
+
+class SharedMemoryCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache')
+        self.cache = self.backend()
+
+    def backend(self, location=None, **options):
+        options.setdefault('SLOTS', 16)
+        options.setdefault('SLOT_SIZE', 1024)
+        options.setdefault('WAYS', 4)
+        return SharedMemoryCache(location or self.location,
+                                 {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """get, set, add, touch и delete работают как у LocMemCache."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertTrue(self.cache.add('other', 2))
+        self.cache.set('short', 1, 0.1)
+        time.sleep(0.2)
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertFalse(self.cache.touch('short'))
+        self.assertTrue(self.cache.touch('key', None))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('other'))
+
+    def test_large_values(self):
+        """Большое значение сжимается, несжимаемое не кешируется."""
+        self.cache.set('page', 'пост ' * 1000)
+        self.assertEqual(self.cache.get('page'), 'пост ' * 1000)
+        self.cache.set('page', os.urandom(2000))
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_clock_keeps_recently_read_keys(self):
+        """При вытеснении из набора прочитанные ключи остаются."""
+        cache = self.backend(self.location + '-small', SLOTS=4)
+        for number in range(4):
+            cache.set(f'key{number}', number)
+        cache.get('key0')
+        cache.set('key4', 4)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertEqual(cache.get('key4'), 4)
+        self.assertEqual(sum(cache.get(f'key{number}') is not None
+                             for number in range(1, 4)), 2)
+
+    def test_values_are_shared_between_processes(self):
+        """Значение, записанное дочерним процессом, видно родителю."""
+        self.cache.get('warm')
+        context = multiprocessing.get_context('fork')
+        process = context.Process(
+            target=lambda: self.backend().set('child', 'из процесса'))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.cache.get('child'), 'из процесса')
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.storage = storage.ContentAddressedStorage(
+            location=self.root, base_url='/media/')
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковое содержимое получает одно имя и один файл."""
+        first = self.storage.save('posts/a.GIF', ContentFile(b'picture'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'picture'))
+        other = self.storage.save('posts/a.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertTrue(storage.is_hashed(first))
+        files = [name for _, _, names in os.walk(self.root)
+                 for name in names if not name.startswith('.')]
+        self.assertEqual(len(files), 2)
+
+    def test_release_keeps_referenced_and_fresh_files(self):
+        """release() не трогает файл, пока на него есть ссылки или пока
+        не истекла отсрочка после последней загрузки."""
+        name = self.storage.save('posts/a.gif', ContentFile(b'picture'))
+        self.assertFalse(self.storage.release(name, lambda: False))
+        old = time.time() - storage.RELEASE_GRACE - 1
+        os.utime(self.storage.path(name), (old, old))
+        self.assertFalse(self.storage.release(name, lambda: True))
+        self.assertTrue(self.storage.release(name, lambda: False))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_reupload_during_release_keeps_file(self):
+        """Файл, загруженный снова, пока release() проверял ссылки,
+        не удаляется."""
+        name = self.storage.save('posts/a.gif', ContentFile(b'picture'))
+        old = time.time() - storage.RELEASE_GRACE - 1
+        os.utime(self.storage.path(name), (old, old))
+
+        def reuploaded():
+            self.storage.save('posts/b.gif', ContentFile(b'picture'))
+            return False
+
+        self.assertFalse(self.storage.release(name, reuploaded))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_media_route_sets_cache_headers(self):
+        """Адрес media отдаёт файлы через serve_media и без DEBUG."""
+        name = self.storage.save('posts/a.gif', ContentFile(b'picture'))
+        self.assertFalse(settings.DEBUG)
+        with override_settings(MEDIA_ROOT=self.root):
+            response = Client().get(settings.MEDIA_URL + name)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_hashed_media_is_immutable(self):
+        """Файлы с хешем в имени отдаются с Cache-Control: immutable."""
+        name = self.storage.save('posts/a.gif', ContentFile(b'picture'))
+        with open(os.path.join(self.root, 'plain.txt'), 'w') as file:
+            file.write('text')
+        request = RequestFactory().get('/media/')
+        hashed = views.serve_media(request, name, self.root)
+        plain = views.serve_media(request, 'plain.txt', self.root)
+        self.assertIn('immutable', hashed['Cache-Control'])
+        self.assertIn('max-age=31536000', hashed['Cache-Control'])
+        self.assertFalse(plain.has_header('Cache-Control'))
+
+
+class UploadsTest(TestCase):
+    def image(self, size, fmt='JPEG', **options):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, fmt, **options)
+        return SimpleUploadedFile(f'picture.{fmt.lower()}',
+                                  buffer.getvalue(), f'image/{fmt.lower()}')
+
+    def test_handler_stops_storing_after_limit(self):
+        """Загрузка больше лимита помечается и отдаётся пустой, поэтому её
+        отклоняет и обычное поле картинки."""
+        handler = uploads.CappedUploadHandler()
+        handler.new_file('image', 'big.jpg', 'image/jpeg', None)
+        with mock.patch.object(uploads, 'MAX_SIZE', 10):
+            for start in range(0, 30, 6):
+                handler.receive_data_chunk(b'x' * 6, start)
+            file = handler.file_complete(30)
+        self.assertTrue(file.oversized)
+        self.assertEqual((file.size, file.read()), (0, b''))
+        self.assertIn('receive_ms', file.upload_timings)
+        with self.assertRaisesMessage(ValidationError, 'Файл больше'):
+            uploads.ImageUploadField().clean(file)
+        with self.assertRaises(ValidationError):
+            forms.ImageField().clean(file)
+
+    def test_exif_is_stripped_and_large_images_downscaled(self):
+        """Оригинал поворачивается по EXIF, теряет метаданные и
+        уменьшается до UPLOAD_MAX_DIMENSION."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        upload = self.image((3000, 1000), exif=exif.tobytes())
+        with self.assertLogs('yatube.uploads') as logs:
+            result = uploads.ImageUploadField().clean(upload)
+        image = Image.open(result)
+        self.assertEqual(image.size, (853, uploads.MAX_DIMENSION))
+        self.assertNotIn('exif', image.info)
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report['action'], 'resized')
+        self.assertEqual(report['size_in'], [3000, 1000])
+        for timing in ('validate_ms', 'process_ms'):
+            self.assertIn(timing, report)
+
+    def animation(self, size, frames=2, **options):
+        buffer = io.BytesIO()
+        images = [Image.new('RGB', size, color)
+                  for color in ('red', 'blue', 'green')[:frames]]
+        images[0].save(buffer, 'WEBP', save_all=True,
+                       append_images=images[1:], duration=100, loop=0,
+                       **options)
+        return SimpleUploadedFile('animation.webp', buffer.getvalue(),
+                                  'image/webp')
+
+    def test_animation_loses_metadata(self):
+        """Анимация сохраняет кадры, но теряет EXIF и XMP."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        upload = self.animation((60, 40), exif=exif.tobytes(),
+                                xmp=b'<x:xmpmeta>GPS</x:xmpmeta>')
+        with self.assertLogs('yatube.uploads'):
+            result = uploads.ImageUploadField().clean(upload)
+        image = Image.open(result)
+        self.assertEqual(image.n_frames, 2)
+        for key in uploads.METADATA:
+            self.assertNotIn(key, image.info)
+
+    def test_large_animation_is_rejected(self):
+        """Анимация больше UPLOAD_MAX_DIMENSION или слишком длинная
+        отклоняется."""
+        field = uploads.ImageUploadField()
+        with mock.patch.object(uploads, 'MAX_DIMENSION', 50):
+            with self.assertRaisesMessage(ValidationError, 'Анимация'):
+                field.clean(self.animation((60, 40)))
+        with mock.patch.object(uploads, 'MAX_PIXELS', 60 * 40 * 2):
+            with self.assertRaisesMessage(ValidationError, 'Анимация'):
+                field.clean(self.animation((60, 40), frames=3))
+
+    def test_clean_images_are_kept(self):
+        """Картинку без метаданных в пределах размеров не перекодируем."""
+        upload = self.image((20, 10), 'PNG')
+        with self.assertLogs('yatube.uploads'):
+            self.assertIs(uploads.ImageUploadField().clean(upload), upload)
+
+    def test_header_limits(self):
+        """Формат и разрешение проверяются по заголовку."""
+        field = uploads.ImageUploadField()
+        with self.assertRaisesMessage(ValidationError, 'JPEG, PNG'):
+            field.clean(self.image((20, 10), 'BMP'))
+        with mock.patch.object(uploads, 'MAX_PIXELS', 100):
+            with self.assertRaisesMessage(ValidationError, 'разрешение'):
+                field.clean(self.image((20, 10)))
@@ -0,0 +1,180 @@
+"""Загрузка картинок с ограниченным расходом памяти.
+
+CappedUploadHandler (единственный в FILE_UPLOAD_HANDLERS) пишет любой
+загружаемый файл во временный файл на диске, а не в память, и перестаёт
+сохранять его после UPLOAD_MAX_SIZE байт: остаток запроса дочитывается
+впустую, а файл помечается как oversized и отдаётся пустым. Обрезанный
+файл прошёл бы проверку обычного forms.ImageField и сохранился битым,
+а пустой отклоняет любое поле файла. Тело запроса целиком всё равно
+лучше ограничивать на веб-сервере.
+
+ImageUploadField проверяет картинку по заголовку, не декодируя пиксели,
+и только если нужно перекодирует её: поворачивает по EXIF и убирает
+метаданные (EXIF с координатами, XMP), уменьшает слишком большие
+оригиналы (JPEG - ещё при декодировании, через draft). Анимация
+с метаданными пересобирается по кадрам без них, а больше MAX_DIMENSION
+или MAX_PIXELS на все кадры - отклоняется: уменьшать её пришлось бы,
+держа в памяти каждый кадр. Время приёма, проверки и обработки каждой
+загрузки пишется строкой JSON в логгер yatube.uploads.
+"""
+import json
+import logging
+import math
+import time
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps, ImageSequence
+
+
+logger = logging.getLogger('yatube.uploads')
+
+MAX_SIZE = getattr(settings, 'UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+MAX_PIXELS = getattr(settings, 'UPLOAD_MAX_PIXELS', 40_000_000)
+MAX_DIMENSION = getattr(settings, 'UPLOAD_MAX_DIMENSION', 2560)
+FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+METADATA = ('exif', 'xmp', 'XML:com.adobe.xmp')
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+class CappedUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.started = time.perf_counter()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= MAX_SIZE:
+            self.file.write(raw_data)
+        elif self.file.tell():
+            self.file.seek(0)
+            self.file.truncate()
+
+    def file_complete(self, file_size):
+        oversized = self.received > MAX_SIZE
+        file = super().file_complete(0 if oversized else file_size)
+        file.oversized = oversized
+        file.upload_timings = {'receive_ms': elapsed_ms(self.started)}
+        return file
+
+
+class ImageUploadField(forms.ImageField):
+    default_error_messages = {
+        'oversized': f'Файл больше {MAX_SIZE // (1024 * 1024)} МБ.',
+        'format': 'Поддерживаются картинки JPEG, PNG, GIF и WebP.',
+        'pixels': 'Слишком большое разрешение картинки.',
+        'animation': (f'Анимация должна быть не больше {MAX_DIMENSION} '
+                      f'точек по большей стороне и не слишком длинной.'),
+    }
+
+    def to_python(self, data):
+        if getattr(data, 'oversized', False):
+            raise forms.ValidationError(self.error_messages['oversized'],
+                                        code='oversized')
+        started = time.perf_counter()
+        file = super().to_python(data)
+        if file is None:
+            return None
+        # file.image - результат Image.open() и verify(): размеры и формат
+        # из заголовка, пиксели не декодированы.
+        width, height = file.image.size
+        if file.image.format not in FORMATS:
+            raise forms.ValidationError(self.error_messages['format'],
+                                        code='format')
+        if width * height > MAX_PIXELS:
+            raise forms.ValidationError(self.error_messages['pixels'],
+                                        code='pixels')
+        timings = dict(getattr(file, 'upload_timings', {}),
+                       validate_ms=elapsed_ms(started))
+        started = time.perf_counter()
+        size, fmt = file.size, file.image.format
+        try:
+            file, action = prepare(file)
+        except AnimationTooLarge:
+            raise forms.ValidationError(self.error_messages['animation'],
+                                        code='animation')
+        timings['process_ms'] = elapsed_ms(started)
+        logger.info(json.dumps({
+            'name': file.name, 'format': fmt, 'bytes_in': size,
+            'bytes_out': file.size, 'size_in': [width, height],
+            'action': action, **timings}))
+        return file
+
+
+class AnimationTooLarge(Exception):
+    pass
+
+
+def _source(file):
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+    file.seek(0)
+    return file
+
+
+def prepare(file):
+    """Готовит картинку к сохранению и возвращает её вместе с тем, что
+    с ней сделано: 'kept', 'stripped' (убраны метаданные) или 'resized'.
+    Обработанная картинка записывается на место исходной, в тот же
+    временный файл."""
+    with Image.open(_source(file)) as image:
+        resize = max(image.size) > MAX_DIMENSION
+        metadata = any(key in image.info for key in METADATA)
+        if getattr(image, 'is_animated', False):
+            return _prepare_animation(file, image, resize, metadata)
+        if not (resize or metadata):
+            file.seek(0)
+            return file, 'kept'
+        fmt = image.format
+        options = dict(SAVE_OPTIONS.get(fmt, {}))
+        if image.info.get('icc_profile'):
+            options['icc_profile'] = image.info['icc_profile']
+        if resize and fmt == 'JPEG':
+            # Декодер JPEG сразу уменьшает картинку в 2-8 раз, но не
+            # меньше итогового размера.
+            scale = MAX_DIMENSION / max(image.size)
+            image.draft(image.mode, (math.ceil(image.width * scale),
+                                     math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if resize:
+            image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+    _rewrite(file, image.save, fmt, **options)
+    return file, 'resized' if resize else 'stripped'
+
+
+def _prepare_animation(file, image, resize, metadata):
+    width, height = image.size
+    if resize or image.n_frames * width * height > MAX_PIXELS:
+        raise AnimationTooLarge
+    if not metadata:
+        file.seek(0)
+        return file, 'kept'
+    fmt = image.format
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 0))
+        frames.append(frame.copy())
+    # Кадры сохраняются без exif и xmp: их нет в параметрах save().
+    _rewrite(file, frames[0].save, fmt, save_all=True,
+             append_images=frames[1:], duration=durations,
+             loop=image.info.get('loop', 0),
+             **SAVE_OPTIONS.get(fmt, {}))
+    return file, 'stripped'
+
+
+def _rewrite(file, save, fmt, **options):
+    file.seek(0)
+    file.truncate()
+    save(file, fmt, **options)
+    file.size = file.tell()
+    file.seek(0)
@@ -1,4 +1,11 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from .middleware import stats
+from .storage import IMMUTABLE_MAX_AGE, is_hashed
 
 
 def page_not_found(request, exception):
@@ -8,3 +15,26 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def query_stats(request):
+    """Сводка QueryInstrumentationMiddleware по страницам (только локально
+    или для персонала)."""
+    allowed = settings.DEBUG or request.user.is_staff
+    if not (getattr(settings, 'QUERY_INSTRUMENTATION', False) and allowed):
+        raise Http404
+    if request.GET.get('reset'):
+        stats.clear()
+    return JsonResponse(stats.summary(), json_dumps_params={'indent': 2})
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """django.views.static.serve, который отдаёт файлы с хешем в имени
+    с Cache-Control: immutable. По умолчанию файлы берутся из
+    MEDIA_ROOT."""
+    response = serve(request, path, document_root or settings.MEDIA_ROOT,
+                     show_indexes)
+    if is_hashed(path) and response.status_code == 200:
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=IMMUTABLE_MAX_AGE)
+    return response
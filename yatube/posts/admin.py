@@ -1,30 +1,77 @@
 from django.contrib import admin
-from .models import Group, Post, Comment, Follow
+from django.db.models import ImageField, Q
+from core.changelist import LargeTableAdmin
+from core.uploads import ImageUploadField
+from search import index
+from .models import Group, Post, Comment, Follow, User
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group', 'image')
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    list_deferred = ('image_variants',)
+    sortable_by = ('pk', 'pub_date')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    # Та же проверка и подготовка картинки, что и в форме на сайте.
+    formfield_overrides = {ImageField: {'form_class': ImageUploadField}}
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not index.available(queryset.db):
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        if not index.match_expression(search_term):
+            return queryset.none(), False
+        return queryset.filter(pk__in=index.matching_ids(search_term)), False
 
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'post', 'text', 'created', 'author')
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'post_excerpt', 'text', 'created', 'author')
+    list_select_related = ('post', 'author')
+    list_deferred = ('post__text', 'post__image_variants')
+    sortable_by = ('pk', 'created')
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
+    raw_id_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
+    def post_excerpt(self, comment):
+        # Как str(post), но без загрузки полного текста поста.
+        return comment.post.excerpt[:15]
+    post_excerpt.short_description = 'Пост'
 
-class FollowAdmin(admin.ModelAdmin):
+
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
-    list_editable = ('author',)
-    search_fields = ('user',)
+    list_select_related = ('user', 'author')
+    # Новые подписки первыми: порядок первичного ключа, без сортировки.
+    ordering = ('-pk',)
+    sortable_by = ()
+    search_fields = ('user__username', 'author__username')
+    raw_id_fields = ('user', 'author')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Точное совпадение имени ищется по уникальному индексу username,
+        # а подписки - по индексам user и author, а не icontains по
+        # всем пользователям.
+        if not search_term:
+            return queryset, False
+        users = User.objects.filter(username=search_term.strip())
+        return queryset.filter(Q(user__in=users) | Q(author__in=users)), False
+
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,78 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 в той же
+транзакции, что и запись, поэтому страницам не нужен COUNT(*).
+Если строки счётчиков ещё нет, она пересчитывается с нуля при
+увеличении счётчика; уменьшение без строки ничего не делает - так
+удаление пользователя каскадом не создаёт её заново.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import timeline
+from .models import Comment, Counters, Follow, Post
+
+
+User = get_user_model()
+
+
+def count_of(model, field, outer='pk'):
+    related = model.objects.filter(**{field: OuterRef(outer)}).order_by()
+    return Coalesce(Subquery(
+        related.values(field).annotate(total=Count('pk')).values('total')),
+        0)
+
+
+def user_totals(outer):
+    return {'posts': count_of(Post, 'author', outer),
+            'followers': count_of(Follow, 'author', outer),
+            'following': count_of(Follow, 'user', outer)}
+
+
+def for_user(user):
+    try:
+        return user.counters
+    except Counters.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def recount_user(user_id):
+    if not User.objects.filter(pk=user_id).exists():
+        return None
+    totals = {'posts': Post.objects.filter(author_id=user_id).count(),
+              'followers': Follow.objects.filter(author_id=user_id).count(),
+              'following': Follow.objects.filter(user_id=user_id).count()}
+    counters, _ = Counters.objects.update_or_create(user_id=user_id,
+                                                    defaults=totals)
+    return counters
+
+
+def change_user(user_id, field, delta):
+    counters = Counters.objects.filter(user_id=user_id)
+    if delta < 0:
+        counters.filter(**{f'{field}__gt': 0}).update(
+            **{field: F(field) + delta})
+    elif not counters.update(**{field: F(field) + delta}):
+        recount_user(user_id)
+
+
+def change_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gt=0)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def rebuild():
+    missing = User.objects.filter(counters__isnull=True).values_list(
+        'pk', flat=True)
+    Counters.objects.bulk_create(
+        (Counters(user_id=pk) for pk in missing.iterator()),
+        ignore_conflicts=True)
+    users = Counters.objects.update(**user_totals('user_id'))
+    # Снять флаг может только resume_fan_out, дописав посты в ленты.
+    Counters.objects.filter(followers__gt=timeline.FANOUT_LIMIT).update(
+        celebrity=True)
+    posts = Post.objects.update(comments_count=count_of(Comment, 'post'))
+    return users, posts
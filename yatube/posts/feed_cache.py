@@ -0,0 +1,286 @@
+"""Кеш лент: списки id постов с версионными ключами и объекты постов.
+
+У каждой ленты (общая, группы, автора, подписок пользователя) есть
+версия, которая меняется сигналами при записи постов, комментариев
+и подписок. Под ключом из ленты и её версии хранятся только массивы id
+первых FEED_IDS_LIMIT постов и их updated_at; сами посты кешируются
+отдельно, по одному на id и updated_at. Страница ленты - срез массива
+и get_many объектов, поэтому страницы, ленты и пользователи делят одни
+и те же записи кеша. Готовый HTML хранится только для гостей, у которых
+страница одна на всех.
+
+Имя автора и название группы в updated_at поста не отражаются, поэтому
+у автора и группы есть свои версии (author_info, group_info): объект
+поста в кеше помечен ими и устаревает, когда автора или группу
+переименовали.
+
+Списки id и страницы гостей читаются с основной базы (routers.primary):
+собранные с отстающей реплики, они остались бы в кеше под новой версией
+ленты без постов, которые её изменили.
+"""
+import hashlib
+import uuid
+from array import array
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import routers
+
+from . import timeline
+from .models import Follow, Post, TimelineEntry, User
+from .paginators import (BACKWARD, FORWARD, POST_KEYS, CursorPage,
+                         CursorPaginator, cursor_ordering)
+
+
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60 * 6)
+FEED_IDS_LIMIT = getattr(settings, 'FEED_IDS_LIMIT', 1000)
+POST_OBJECT_TIMEOUT = getattr(settings, 'POST_OBJECT_TIMEOUT', 60 * 60)
+INDEX = 'index'
+# Поля автора в кешированных объектах постов: карточке нужны имя и
+# логин, а хеш пароля, почта и флаги в общий кеш попадать не должны.
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def author_feed(username):
+    return f'author:{username}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_feed(post_id):
+    return f'post:{post_id}'
+
+
+def author_info(user_id):
+    return f'author-info:{user_id}'
+
+
+def group_info(group_id):
+    return f'group-info:{group_id}'
+
+
+def index_feeds(request):
+    return [INDEX]
+
+
+def group_feeds(request, slug):
+    return [group_feed(slug)]
+
+
+def profile_feeds(request, username):
+    return [author_feed(username)]
+
+
+def follow_feeds(user_id, posts):
+    """Ленты, от которых зависит лента подписок: если она собрана из Post
+    (есть популярные авторы), в ней видны и новые посты общей ленты."""
+    feeds = [follow_feed(user_id)]
+    if posts.model is Post:
+        feeds.append(INDEX)
+    return feeds
+
+
+def post_feeds(post, old_group_slug=None):
+    """Ленты, в которых виден пост: их версии меняются при его записи."""
+    feeds = [INDEX, author_feed(post.author.username), post_feed(post.pk)]
+    if post.group_id:
+        feeds.append(group_feed(post.group.slug))
+    if old_group_slug:
+        feeds.append(group_feed(old_group_slug))
+    if not timeline.is_celebrity(post.author_id):
+        followers = Follow.objects.filter(
+            author_id=post.author_id).values_list('user_id', flat=True)
+        feeds.extend(follow_feed(user_id) for user_id in followers)
+    return feeds
+
+
+def author_shown_in(user):
+    """Версии, от которых зависит то, как показан автор: его объектов
+    постов и страниц гостей с его постами."""
+    slugs = Post.objects.filter(
+        author=user, group__isnull=False).order_by().values_list(
+        'group__slug', flat=True).distinct()
+    return [author_info(user.pk), INDEX, author_feed(user.username),
+            *map(group_feed, slugs)]
+
+
+def group_shown_in(group):
+    """То же для группы: её объекты постов и страницы с её постами."""
+    authors = Post.objects.filter(group=group).order_by().values_list(
+        'author__username', flat=True).distinct()
+    return [group_info(group.pk), INDEX, group_feed(group.slug),
+            *map(author_feed, authors)]
+
+
+def _version_key(feed):
+    return 'feed-version:' + hashlib.md5(feed.encode()).hexdigest()
+
+
+def versions(feeds):
+    keys = [_version_key(feed) for feed in feeds]
+    known = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in known}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        known.update(missing)
+    return [known[key] for key in keys]
+
+
+def bump(*feeds):
+    cache.set_many({_version_key(feed): uuid.uuid4().hex for feed in feeds},
+                   timeout=None)
+
+
+def page_key(request, feeds):
+    raw = '|'.join([request.get_full_path()] + versions(feeds))
+    return 'feed-page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_guest_page(feeds):
+    """Кеширует страницу ленты для гостей; feeds(request, **kwargs) - её
+    ленты. Гостям достаётся одна общая копия страницы, а вошедшим она
+    собирается из списков id и общих объектов постов: копия страницы на
+    каждого пользователя занимала бы память и не переиспользовалась."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            key = page_key(request, feeds(request, *args, **kwargs))
+            uncached = []
+
+            def render():
+                with routers.primary():
+                    response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    return response
+                uncached.append(response)
+
+            # Истёкшую страницу пересчитывает один запрос, а не все сразу.
+            response = cache.get_or_set(key, render, FEED_CACHE_TIMEOUT)
+            return uncached[0] if response is None else response
+        return wrapper
+    return decorator
+
+
+def _ids_key(feeds):
+    raw = '|'.join(feeds + versions(feeds))
+    return 'feed-ids:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _stamp(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+
+def feed_ids(feeds, posts, keys=POST_KEYS):
+    """Первые FEED_IDS_LIMIT постов ленты: массивы id и отметок updated_at
+    в порядке ленты. posts - queryset Post или TimelineEntry."""
+    def build():
+        fields = (('post_id', 'post__updated_at')
+                  if posts.model is TimelineEntry else ('pk', 'updated_at'))
+        with routers.primary():
+            rows = list(posts.order_by(*cursor_ordering(keys)).values_list(
+                *fields)[:FEED_IDS_LIMIT])
+        ids, stamps = array('q'), array('q')
+        for pk, updated_at in rows:
+            ids.append(pk)
+            stamps.append(_stamp(updated_at))
+        return ids, stamps
+
+    return cache.get_or_set(_ids_key(feeds), build, FEED_CACHE_TIMEOUT)
+
+
+def _object_key(pk, stamp):
+    return f'post-object:{pk}:{stamp}'
+
+
+def _author_deferred():
+    return [f'author__{field.name}'
+            for field in User._meta.concrete_fields
+            if field.name not in AUTHOR_FIELDS]
+
+
+def _related(post):
+    related = [author_info(post.author_id)]
+    if post.group_id:
+        related.append(group_info(post.group_id))
+    return related
+
+
+def _related_versions(posts):
+    """Версии автора и группы каждого поста одним get_many: {pk: строка}."""
+    related = sorted({info for post in posts for info in _related(post)})
+    known = dict(zip(related, versions(related)))
+    return {post.pk: '|'.join(known[info] for info in _related(post))
+            for post in posts}
+
+
+def hydrate(ids, stamps):
+    """Посты по id в том же порядке. Объект поста кешируется под его id
+    и updated_at, поэтому одну запись делят все ленты, страницы
+    и пользователи; промахи и объекты с устаревшими автором или группой
+    дочитываются одним запросом id__in."""
+    keys = [_object_key(pk, stamp) for pk, stamp in zip(ids, stamps)]
+    cached = cache.get_many(keys)
+    current = _related_versions([post for post, _ in cached.values()])
+    found = {key: post for key, (post, related) in cached.items()
+             if current[post.pk] == related}
+    missing = [pk for pk, key in zip(ids, keys) if key not in found]
+    if missing:
+        loaded = Post.objects.summaries().select_related(
+            'author', 'group').defer(*_author_deferred()).in_bulk(missing)
+        related = _related_versions(loaded.values())
+        fresh = {_object_key(post.pk, _stamp(post.updated_at)): post
+                 for post in loaded.values()}
+        cache.set_many({key: (post, related[post.pk])
+                        for key, post in fresh.items()}, POST_OBJECT_TIMEOUT)
+        found.update(fresh)
+        # Пост мог измениться после сборки списка: берём свежую версию.
+        found.update({key: loaded[pk] for pk, key in zip(ids, keys)
+                      if key not in found and pk in loaded})
+    return [found[key] for key in keys if key in found]
+
+
+def feed_page(cursor, feeds, posts, per_page, keys=POST_KEYS):
+    """Страница ленты по закешированному списку id.
+
+    Курсоры те же, что у CursorPaginator. Если страница выходит за
+    пределы списка (а лента длиннее FEED_IDS_LIMIT) или курсор указывает
+    на пост, которого в списке нет, она строится запросом по индексу.
+    """
+    paginator = CursorPaginator(posts, per_page, keys=keys)
+    ids, stamps = feed_ids(feeds, posts, keys)
+    truncated = len(ids) >= FEED_IDS_LIMIT
+    start = 0
+    position = paginator.decode(cursor)
+    if position is not None:
+        direction, values = position
+        try:
+            index = ids.index(values[-1])
+        except ValueError:
+            return paginator.get_page(cursor)
+        start = index + 1 if direction == FORWARD else max(
+            0, index - per_page)
+        if start >= len(ids) and not truncated:
+            start = 0
+    stop = start + per_page
+    if truncated and stop > len(ids):
+        return paginator.get_page(cursor)
+    page = hydrate(ids[start:stop], stamps[start:stop])
+    has_next = stop < len(ids) or truncated
+    return CursorPage(
+        page, paginator,
+        next_cursor=(paginator.encode_values(
+            FORWARD, (page[-1].pub_date, page[-1].pk))
+            if has_next and page else None),
+        previous_cursor=(paginator.encode_values(
+            BACKWARD, (page[0].pub_date, page[0].pk))
+            if start > 0 and page else None))
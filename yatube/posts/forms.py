@@ -1,4 +1,6 @@
 from django import forms
+
+from core.uploads import ImageUploadField
 from .models import Post, Comment
 
 
@@ -6,6 +8,7 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': ImageUploadField}
         labels = {'text': 'Творите',
                   'group': 'Выберите группу соратников',
                   'image': 'Картинка'}
@@ -0,0 +1,44 @@
+from tasks.queue import task
+
+from . import feed_cache, thumbnails, timeline
+from .models import Follow, Post
+
+
+@task(unique=True)
+def generate_thumbnails(name):
+    image_variants = thumbnails.generate(name)
+    if image_variants is None:
+        raise RuntimeError(f'Миниатюры для {name} не созданы')
+    thumbnails.stamp(name, image_variants)
+    feeds = []
+    for post in Post.objects.filter(image=name).select_related(
+            'author', 'group'):
+        feeds += feed_cache.post_feeds(post)
+    feed_cache.bump(*feeds)
+
+
+@task(unique=True)
+def release_image(name):
+    thumbnails.release(name)
+
+
+@task
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return
+    timeline.fan_out(post, inline=True)
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    feed_cache.bump(*(feed_cache.follow_feed(user_id)
+                      for user_id in followers))
+
+
+@task(unique=True)
+def resume_fan_out(author_id):
+    if not timeline.resume_fan_out(author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    feed_cache.bump(*(feed_cache.follow_feed(user_id)
+                      for user_id in followers))
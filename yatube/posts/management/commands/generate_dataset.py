@@ -0,0 +1,211 @@
+import io
+import itertools
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, make_excerpt
+
+
+User = get_user_model()
+
+PHRASES = 2000
+HISTORY_DAYS = 365 * 3
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет bulk_create записать свои даты в поля auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Генерирует большой воспроизводимый набор данных: пользователей, '
+            'группы, посты, комментарии и подписки со степенным '
+            'распределением популярности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--max-follows', type=int, default=500,
+                            help='Максимум подписок одного пользователя')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель степени популярности авторов')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько разных картинок создать')
+        parser.add_argument('--image-share', type=float, default=0.1,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load')
+        parser.add_argument('--no-derived', action='store_true',
+                            help='Не пересчитывать счётчики и ленты')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.phrases = [self.faker.sentence(nb_words=10)
+                        for _ in range(PHRASES)]
+        self.now = timezone.now()
+
+        user_ids = self.create_users()
+        group_ids = self.create_groups()
+        images = self.create_images()
+        first, last = self.create_posts(user_ids, group_ids, images)
+        self.create_comments(user_ids, first, last)
+        self.create_follows(user_ids)
+        if not options['no_derived']:
+            call_command('rebuild_counters', stdout=self.stdout)
+            call_command('rebuild_timelines', stdout=self.stdout)
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def insert(self, model, objects, **kwargs):
+        """Пишет объекты пачками и возвращает диапазон новых первичных
+        ключей: SQLite выдаёт их подряд, начиная с текущего максимума."""
+        before = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        total = 0
+        for batch in batched(objects, self.options['batch_size']):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+            total += len(batch)
+        self.log(f'{model._meta.verbose_name_plural}: {total}')
+        after = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        return before + 1, after
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choice(self.phrases)
+                        for _ in range(self.rng.randint(low, high)))
+
+    def moment(self):
+        return self.now - timedelta(
+            seconds=self.rng.randrange(HISTORY_DAYS * 24 * 60 * 60))
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        password = make_password('password')
+        first, last = self.insert(User, (
+            User(username=f'{prefix}{number:07d}',
+                 first_name=self.faker.first_name(),
+                 last_name=self.faker.last_name(),
+                 email=f'{prefix}{number}@example.com',
+                 password=password)
+            for number in range(self.options['users'])))
+        return list(range(first, last + 1))
+
+    def create_groups(self):
+        prefix = self.options['prefix']
+        first, last = self.insert(Group, (
+            Group(title=self.faker.catch_phrase(),
+                  slug=f'{prefix}-group-{number}',
+                  description=self.text(1, 3))
+            for number in range(self.options['groups'])))
+        return list(range(first, last + 1))
+
+    def create_images(self):
+        names = []
+        for number in range(self.options['images']):
+            buffer = io.BytesIO()
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{self.options["prefix"]}-{number}.jpg',
+                ContentFile(buffer.getvalue())))
+        return names
+
+    def author_picker(self, user_ids):
+        """Выбор автора по закону Ципфа: немногие пишут и читаются больше
+        всех остальных."""
+        order = list(user_ids)
+        self.rng.shuffle(order)
+        weights = itertools.accumulate(
+            1 / (rank ** self.options['zipf'])
+            for rank in range(1, len(order) + 1))
+        cumulative = list(weights)
+        total = cumulative[-1]
+        return lambda: order[bisect(cumulative,
+                                    self.rng.random() * total)
+                             if len(order) > 1 else 0]
+
+    def create_posts(self, user_ids, group_ids, images):
+        pick_author = self.author_picker(user_ids)
+        share = self.options['image_share'] if images else 0
+
+        def posts():
+            for _ in range(self.options['posts']):
+                text = self.text(1, 12)
+                yield Post(
+                    author_id=pick_author(),
+                    group_id=(self.rng.choice(group_ids)
+                              if group_ids and self.rng.random() < 0.6
+                              else None),
+                    text=text,
+                    excerpt=make_excerpt(text),
+                    image=(self.rng.choice(images)
+                           if self.rng.random() < share else ''),
+                    pub_date=self.moment())
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            return self.insert(Post, posts())
+
+    def create_comments(self, user_ids, first, last):
+        if last < first or not user_ids:
+            return
+
+        def comments():
+            for _ in range(self.options['comments']):
+                yield Comment(post_id=self.rng.randint(first, last),
+                              author_id=self.rng.choice(user_ids),
+                              text=self.text(1, 3),
+                              created=self.moment())
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, comments())
+
+    def create_follows(self, user_ids):
+        pick_author = self.author_picker(user_ids)
+        limit = min(self.options['max_follows'], len(user_ids) - 1)
+
+        def follows():
+            for user_id in user_ids:
+                wanted = min(int(self.rng.paretovariate(1.2)), limit)
+                authors = {pick_author() for _ in range(wanted)}
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        if limit > 0:
+            self.insert(Follow, follows(), ignore_conflicts=True)
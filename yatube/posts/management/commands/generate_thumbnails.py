@@ -0,0 +1,37 @@
+import os
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Готовит миниатюры и варианты всех картинок постов на всех '
+            'ядрах и записывает их в посты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1,
+                            help='0 - без пула, в текущем процессе')
+        parser.add_argument('--chunksize', type=int, default=16)
+
+    def handle(self, *args, **options):
+        names = list(Post.objects.exclude(image='').order_by()
+                     .values_list('image', flat=True).distinct())
+        workers = options['workers']
+        created = failed = 0
+        with (thumbnails.process_pool(workers) if workers
+              else nullcontext()) as pool:
+            results = (pool.map(thumbnails.generate, names,
+                                chunksize=options['chunksize'])
+                       if pool else map(thumbnails.generate, names))
+            for name, image_variants in zip(names, results):
+                if image_variants is not None:
+                    thumbnails.stamp(name, image_variants)
+                    created += 1
+                else:
+                    failed += 1
+        self.stdout.write(
+            f'Готово картинок: {created}, с ошибками: {failed}')
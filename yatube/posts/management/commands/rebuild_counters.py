@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users, posts = counters.rebuild()
+        self.stdout.write(
+            f'Пересчитано пользователей: {users}, постов: {posts}')
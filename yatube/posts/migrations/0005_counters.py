@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_of(model, field, outer):
+    related = model.objects.filter(**{field: OuterRef(outer)}).order_by()
+    return Coalesce(Subquery(
+        related.values(field).annotate(total=Count('pk')).values('total')),
+        0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Counters = apps.get_model('posts', 'Counters')
+    Counters.objects.bulk_create(
+        (Counters(user_id=pk) for pk in
+         User.objects.values_list('pk', flat=True).iterator()),
+        batch_size=1000)
+    Counters.objects.update(posts=count_of(Post, 'author', 'user_id'),
+                            followers=count_of(Follow, 'author', 'user_id'),
+                            following=count_of(Follow, 'user', 'user_id'))
+    Post.objects.update(comments_count=count_of(Comment, 'post', 'pk'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0004_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:40
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+EXCERPT_LENGTH = 300
+CHUNK_SIZE = 500
+
+
+def fill_excerpts(apps, schema_editor):
+    """Заполняет excerpt порциями по первичному ключу, чтобы не держать
+    в памяти тексты всех постов сразу."""
+    Post = apps.get_model('posts', 'Post')
+    last = 0
+    while True:
+        chunk = list(Post.objects.filter(pk__gt=last).order_by(
+            'pk').only('pk', 'text')[:CHUNK_SIZE])
+        if not chunk:
+            break
+        for post in chunk:
+            post.excerpt = Truncator(post.text).chars(EXCERPT_LENGTH)
+        Post.objects.bulk_update(chunk, ['excerpt'])
+        last = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_comment_cursor_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Начало текста'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_excerpt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_height',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Высота миниатюры'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_url',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Адрес миниатюры'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail_width',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Ширина миниатюры'),
+        ),
+    ]
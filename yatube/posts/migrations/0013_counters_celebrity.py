@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def flag_celebrities(apps, schema_editor):
+    # Посты этих авторов в ленты не раскладывались: их надо подмешивать.
+    Counters = apps.get_model('posts', 'Counters')
+    limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+    Counters.objects.filter(followers__gt=limit).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counters',
+            name='celebrity',
+            field=models.BooleanField(default=False, verbose_name='Посты подмешиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(flag_celebrities, migrations.RunPython.noop),
+    ]
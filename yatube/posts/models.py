@@ -1,8 +1,18 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils.text import Truncator
+
+from core.storage import ContentAddressedStorage
+
+from . import variants
 
 
 User = get_user_model()
+EXCERPT_LENGTH = 300
+
+
+def make_excerpt(text):
+    return Truncator(text).chars(EXCERPT_LENGTH)
 
 
 class Group(models.Model):
@@ -19,12 +29,23 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def summaries(self):
+        """Посты для карточек лент: без полного текста, только excerpt."""
+        return self.defer('text')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Введите текст поста')
+    excerpt = models.CharField('Начало текста',
+                               max_length=EXCERPT_LENGTH,
+                               blank=True,
+                               editable=False)
     pub_date = models.DateTimeField(auto_now_add=True,
-                                    verbose_name='Дата публикации поста',
-                                    db_index=True)
+                                    verbose_name='Дата публикации поста')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения поста')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -43,15 +64,67 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True)
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False)
+    thumbnail_url = models.CharField(
+        'Адрес миниатюры',
+        max_length=255,
+        blank=True,
+        editable=False)
+    thumbnail_width = models.PositiveSmallIntegerField(
+        'Ширина миниатюры',
+        null=True,
+        editable=False)
+    thumbnail_height = models.PositiveSmallIntegerField(
+        'Высота миниатюры',
+        null=True,
+        editable=False)
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='JSON: адреса, форматы и размеры вариантов для srcset')
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and 'text' in self.get_deferred_fields():
+            # Текст не загружался, значит и не менялся.
+            update_fields = ()
+        if update_fields is None or 'text' in update_fields:
+            self.excerpt = make_excerpt(self.text)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        super().save(*args, **kwargs)
+
+    def clear_thumbnail(self):
+        """Сбрасывает отметку о миниатюре, когда меняется картинка."""
+        self.thumbnail_url = self.image_variants = ''
+        self.thumbnail_width = self.thumbnail_height = None
+
+    @property
+    def image_sources(self):
+        return variants.sources(self.image_variants)
+
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
-        ordering = ['-pub_date', 'author']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx')]
 
 
 class Comment(models.Model):
@@ -80,6 +153,9 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_idx')]
 
 
 class Follow(models.Model):
@@ -105,3 +181,63 @@ class Follow(models.Model):
             name='unique_follow'),
             models.CheckConstraint(name='not_self_follow',
                                    check=~models.Q(user=models.F('author')))]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_idx')]
+
+
+class Counters(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    celebrity = models.BooleanField(
+        'Посты подмешиваются в ленты при чтении', default=False)
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель ленты'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ['-pub_date', '-post']
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'],
+            name='unique_timeline_entry')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_feed_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_author_idx')]
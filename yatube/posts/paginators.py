@@ -0,0 +1,139 @@
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+
+
+POST_KEYS = ('pub_date', 'pk')
+PAGE_WINDOW = 2
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def cursor_ordering(lookups, reverse=False):
+    """Сортировка по ключам курсора. F() вместо строк: строка с путём до
+    внешнего ключа развернулась бы в Meta.ordering связанной модели."""
+    return [F(lookup).asc() if reverse else F(lookup).desc()
+            for lookup in lookups]
+
+
+class WindowedPage(Page):
+    """Страница с номерами только вокруг текущей, а не со всем page_range."""
+    is_cursor = False
+
+    @property
+    def page_window(self):
+        start = max(1, self.number - PAGE_WINDOW)
+        stop = min(self.paginator.num_pages, self.number + PAGE_WINDOW)
+        return range(start, stop + 1)
+
+
+class WindowedPaginator(Paginator):
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: без COUNT(*) и без OFFSET."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %s objects>' % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре ключей (по умолчанию pub_date, id).
+
+    keys - атрибуты объектов, из которых собирается курсор,
+    lookups - соответствующие им пути полей для фильтра и сортировки
+    (нужны, если лента сортируется по полям связанной таблицы).
+    """
+
+    def __init__(self, object_list, per_page, keys=POST_KEYS, lookups=None):
+        self.keys = keys
+        self.lookups = lookups or keys
+        super().__init__(object_list.order_by(*cursor_ordering(self.lookups)),
+                         per_page)
+
+    def get_page(self, cursor):
+        position = self.decode(cursor)
+        if position is None:
+            return self._page(self.object_list, reverse=False)
+        direction, values = position
+        reverse = direction == BACKWARD
+        queryset = self.object_list.order_by(
+            *cursor_ordering(self.lookups, reverse)
+        ).filter(self._beyond(values, reverse))
+        page = self._page(queryset, reverse, from_cursor=True)
+        if not page.object_list:
+            return self._page(self.object_list, reverse=False)
+        return page
+
+    def _page(self, queryset, reverse, from_cursor=False):
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            if not has_more:
+                return self._page(self.object_list, reverse=False)
+            rows.reverse()
+        has_next = has_more or (reverse and bool(rows))
+        has_previous = from_cursor and bool(rows)
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode(FORWARD, rows[-1]) if has_next else None,
+            previous_cursor=(self.encode(BACKWARD, rows[0])
+                             if has_previous else None))
+
+    def _beyond(self, values, reverse):
+        first, second = self.lookups
+        operator = 'gt' if reverse else 'lt'
+        return (Q(**{f'{first}__{operator}': values[0]})
+                | Q(**{first: values[0], f'{second}__{operator}': values[1]}))
+
+    def _fields(self):
+        opts = self.object_list.model._meta
+        return [opts.pk if key == 'pk' else opts.get_field(key)
+                for key in self.keys]
+
+    def encode(self, direction, obj):
+        return self.encode_values(
+            direction, [getattr(obj, key) for key in self.keys])
+
+    def encode_values(self, direction, values):
+        parts = [value.isoformat() if hasattr(value, 'isoformat')
+                 else str(value) for value in values]
+        raw = direction + '|'.join(parts)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)).decode()
+            direction, parts = raw[0], raw[1:].split('|')
+            if direction not in (FORWARD, BACKWARD):
+                return None
+            values = [field.to_python(part)
+                      for field, part in zip(self._fields(), parts)]
+        except (binascii.Error, UnicodeDecodeError, IndexError,
+                ValueError, ValidationError):
+            return None
+        if len(values) != len(self.keys) or None in values:
+            return None
+        return direction, values
@@ -0,0 +1,128 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, 'posts', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, 'followers', 1)
+        counters.change_user(instance.user_id, 'following', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'followers', -1)
+    counters.change_user(instance.user_id, 'following', -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def sync_celebrity(sender, instance, raw=False, **kwargs):
+    if not raw:
+        timeline.sync_celebrity(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._old_group_slug, instance._old_image = Post.objects.filter(
+            pk=instance.pk).values_list('group__slug', 'image').first() or (
+            None, None)
+
+
+@receiver(post_save, sender=Post)
+def bump_post_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(*feed_cache.post_feeds(
+            instance, getattr(instance, '_old_group_slug', None)))
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump(*feed_cache.post_feeds(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(feed_cache.post_feed(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_feeds(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(feed_cache.follow_feed(instance.user_id),
+                        feed_cache.author_feed(instance.author.username))
+
+
+@receiver(post_save, sender=Group)
+def bump_group_feed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(*feed_cache.group_shown_in(instance))
+
+
+@receiver(post_save, sender=User)
+def bump_author_feeds(sender, instance, created, raw=False,
+                      update_fields=None, **kwargs):
+    # Вход обновляет только last_login: имя автора не меняется.
+    if raw or created or (update_fields is not None and not set(
+            update_fields) & set(feed_cache.AUTHOR_FIELDS)):
+        return
+    feed_cache.bump(*feed_cache.author_shown_in(instance))
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if not raw and old_image and old_image != instance.image.name:
+        thumbnails.schedule_release(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        thumbnails.schedule_release(instance.image.name)
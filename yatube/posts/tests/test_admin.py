@@ -0,0 +1,154 @@
+import re
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core import admin_benchmark, changelist, uploads
+from ..admin import PostAdmin
+from ..models import Comment, Follow, Post, User
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+from .test_query_plans import bad_steps, query_plan
+
+
+CHANGELISTS = ('admin:posts_post_changelist',
+               'admin:posts_comment_changelist',
+               'admin:posts_follow_changelist')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class AdminChangeListTest(MyTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def get(self, name, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def add_rows(self, count):
+        posts = [Post.objects.create(author=self.author,
+                                     group=self.group_new, text=f'пост {n}')
+                 for n in range(count)]
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text='ответ')
+            for post in posts)
+        Follow.objects.bulk_create(
+            Follow(user=User.objects.create_user(f'reader{n}'),
+                   author=self.author)
+            for n in range(count))
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов страницы списка не зависит от числа строк."""
+        before = {name: len(self.get(name)[1]) for name in CHANGELISTS}
+        self.add_rows(20)
+        for name in CHANGELISTS:
+            with self.subTest(name=name):
+                self.assertEqual(len(self.get(name)[1]), before[name])
+
+    def test_large_tables_are_not_counted(self):
+        """Без фильтров строки оцениваются, с фильтрами - считаются не
+        дальше COUNT_LIMIT."""
+        self.add_rows(3)
+        with mock.patch.object(changelist, 'ESTIMATE_FROM', 0), \
+                mock.patch.object(changelist, 'COUNT_LIMIT', 2):
+            response, queries = self.get(CHANGELISTS[0])
+            self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+            self.assertEqual(response.context['cl'].result_count,
+                             Post.objects.latest('pk').pk)
+            response, _ = self.get(CHANGELISTS[0],
+                                   {'group__id__exact': self.group_new.pk})
+            self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_estimate_is_corrected_past_deleted_rows(self):
+        """Если строки удаляли, оценка завышена: последняя страница
+        уточняет число строк, а переход за конец открывает её, а не
+        ошибку."""
+        self.add_rows(5)
+        for post in Post.objects.order_by('pk')[:3]:
+            post.delete()
+        url = reverse(CHANGELISTS[0])
+        with mock.patch.object(changelist, 'ESTIMATE_FROM', 0), \
+                mock.patch.object(PostAdmin, 'list_per_page', 2):
+            response, _ = self.get(CHANGELISTS[0])
+            self.assertEqual(response.context['cl'].paginator.num_pages, 3)
+            for page in (1, 2):
+                response = self.client.get(url, {'p': page})
+                self.assertEqual(response.status_code, 200)
+                cl = response.context['cl']
+                self.assertEqual(cl.result_count, 3)
+                self.assertEqual(cl.paginator.num_pages, 2)
+                self.assertEqual(cl.page_num, 1)
+                self.assertEqual(len(cl.result_list), 1)
+
+    def test_changelists_are_indexed(self):
+        """Списки читаются по индексам, без полного просмотра и сортировки."""
+        self.add_rows(5)
+        for name in CHANGELISTS:
+            for sql in self.get(name)[1]:
+                if not sql.startswith('SELECT'):
+                    continue
+                plan = query_plan(sql)
+                by_pk = re.search(r'ORDER BY "(\w+)"\."id" DESC', sql)
+                if by_pk:
+                    # Обход в порядке первичного ключа обрывает LIMIT.
+                    plan.remove(f'SCAN {by_pk.group(1)}')
+                with self.subTest(name=name, sql=sql):
+                    self.assertEqual(bad_steps(plan), [])
+
+    def test_date_hierarchy_probes_periods(self):
+        """Иерархия дат находит годы и месяцы без DISTINCT по таблице."""
+        for year in (2019, 2021):
+            Post.objects.filter(pk=Post.objects.create(
+                author=self.author, text=f'пост {year}').pk).update(
+                pub_date=datetime(year, 3, 1, tzinfo=timezone.utc))
+        response, queries = self.get(CHANGELISTS[0])
+        self.assertFalse([sql for sql in queries if 'DISTINCT' in sql])
+        self.assertContains(response, 'pub_date__year=2019')
+        self.assertContains(response, 'pub_date__year=2021')
+        self.assertNotContains(response, 'pub_date__year=2020')
+        response, _ = self.get(CHANGELISTS[0], {'pub_date__year': 2019})
+        self.assertContains(response, 'pub_date__month=3')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_follow_list_has_no_user_selects(self):
+        """В списке подписок нет полей выбора со всеми пользователями, а
+        поиск ищет имя пользователя целиком."""
+        response, _ = self.get(CHANGELISTS[2])
+        self.assertNotContains(response, 'form-0-author')
+        response, _ = self.get(CHANGELISTS[2], {'q': self.user.username})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response, _ = self.get(CHANGELISTS[2], {'q': 'hasno'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_oversized_image_is_rejected(self):
+        """Картинка больше лимита не сохраняется и через админку."""
+        with mock.patch.object(uploads, 'MAX_SIZE', 10):
+            response = self.client.post(reverse('admin:posts_post_add'), {
+                'text': 'пост из админки', 'author': self.author.pk,
+                'pub_date_0': '2024-01-01', 'pub_date_1': '00:00:00',
+                'image': SimpleUploadedFile('big.gif', self.small_gif,
+                                            'image/gif')})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Файл больше')
+        self.assertFalse(Post.objects.filter(text='пост из админки').exists())
+
+    def test_benchmark_leaves_no_admin_behind(self):
+        """Замер списков сам создаёт и удаляет своего суперпользователя."""
+        users = User.objects.count()
+        results = admin_benchmark.run(iterations=1, warmup=0,
+                                      only=['posts_post'])
+        self.assertEqual(results['posts_post']['status'], 200)
+        self.assertEqual(User.objects.count(), users)
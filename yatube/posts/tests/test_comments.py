@@ -0,0 +1,50 @@
+from http import HTTPStatus
+
+from django.test import override_settings
+from django.urls import reverse
+from ..models import Comment
+from ..views import COMMENTS_PER_PAGE
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CommentsTest(MyTestCase):
+    def test_comments_are_loaded_in_batches(self):
+        """Пост показывает первую порцию, остальные приходят фрагментами."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'ответ {n}')
+            for n in range(COMMENTS_PER_PAGE + 5))
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        first = list(response.context['comments'])
+        self.assertEqual(len(first), COMMENTS_PER_PAGE)
+        cursor = response.context['comments'].next_cursor
+        self.assertContains(response, cursor)
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        rest = list(response.context['comments'])
+        self.assertEqual(len(rest), 6)
+        self.assertFalse(set(first) & set(rest))
+        self.assertIsNone(response.context['comments'].next_cursor)
+
+    def test_ajax_comment_returns_fragment(self):
+        """Комментарий через fetch возвращает только свой фрагмент."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.id})
+        response = self.client_not_author.post(
+            url, {'text': 'быстрый ответ'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertContains(response, 'быстрый ответ',
+                            status_code=HTTPStatus.CREATED)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertTrue(Comment.objects.filter(text='быстрый ответ').exists())
+        response = self.client_not_author.post(
+            url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertTemplateUsed(response, 'posts/includes/comment_form.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'alert-danger',
+                            status_code=HTTPStatus.BAD_REQUEST)
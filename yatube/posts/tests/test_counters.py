@@ -0,0 +1,65 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from ..models import Comment, Counters, Follow, Post, User
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CountersTest(MyTestCase):
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        self.authorized_client.post(reverse('posts:post_create'),
+                                    data={'text': 'ещё один пост'})
+        self.client_not_author.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'ещё комментарий'})
+        self.client_not_author.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author}))
+        author = Counters.objects.get(user=self.author)
+        self.assertEqual(author.posts, 2)
+        self.assertEqual(author.followers, 1)
+        self.assertEqual(Counters.objects.get(user=self.user).following, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.client_not_author.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author}))
+        self.assertEqual(Counters.objects.get(user=self.author).followers, 0)
+
+    def test_rebuild_counters_fixes_drift(self):
+        """Команда rebuild_counters пересчитывает разъехавшиеся счётчики."""
+        Counters.objects.filter(user=self.author).update(posts=42)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        call_command('rebuild_counters', stdout=io.StringIO())
+        self.assertEqual(Counters.objects.get(user=self.author).posts, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_profile_reads_counters(self):
+        """Профиль показывает число постов из счётчика."""
+        Counters.objects.filter(user=self.author).update(posts=42)
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertEqual(response.context['counters'].posts, 42)
+        self.assertContains(response, 'Всего постов: 42')
+
+    def test_deleting_author_keeps_counters_consistent(self):
+        """Удаление автора с постами, комментариями и подписчиками не
+        создаёт заново строку счётчиков удаляемого пользователя."""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(author=author, text='пост перед уходом')
+        Comment.objects.create(author=author, post=post, text='свой ответ')
+        Comment.objects.create(author=author, post=self.post, text='ответ')
+        Follow.objects.create(user=self.user, author=author)
+        Follow.objects.create(user=author, author=self.author)
+        author.delete()
+        connection.check_constraints()
+        self.assertFalse(Counters.objects.filter(user_id=author.pk).exists())
+        self.assertEqual(Counters.objects.get(user=self.user).following, 0)
+        self.assertEqual(Counters.objects.get(user=self.author).followers, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
@@ -0,0 +1,37 @@
+import io
+
+from django.core.management import call_command
+from django.test import override_settings
+from ..models import Counters, Follow, Post
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetTest(MyTestCase):
+    def generate(self, prefix, seed=1):
+        call_command('generate_dataset', users=30, groups=3, posts=200,
+                     comments=100, images=1, seed=seed, prefix=prefix,
+                     batch_size=64, stdout=io.StringIO())
+
+    def test_dataset_is_created_with_derived_data(self):
+        """Команда создаёт данные и пересчитывает счётчики."""
+        before = Post.objects.count()
+        self.generate('gen_a')
+        self.assertEqual(Post.objects.count(), before + 200)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        counters = Counters.objects.filter(user__username__startswith='gen_a')
+        self.assertEqual(sum(counters.values_list('posts', flat=True)), 200)
+        dates = Post.objects.filter(author__username__startswith='gen_a')
+        self.assertGreater(dates.dates('pub_date', 'day').count(), 1)
+
+    def test_same_seed_gives_same_follow_graph(self):
+        """Один и тот же seed даёт одинаковый граф подписок."""
+        def graph(prefix):
+            return sorted(
+                (user[len(prefix):], author[len(prefix):])
+                for user, author in Follow.objects.filter(
+                    user__username__startswith=prefix).values_list(
+                    'user__username', 'author__username'))
+        self.generate('gen_a')
+        self.generate('gen_b')
+        self.assertEqual(graph('gen_a'), graph('gen_b'))
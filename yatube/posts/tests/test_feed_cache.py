@@ -0,0 +1,195 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+from array import array
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from .. import feed_cache
+from ..models import Follow, Post, User
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+
+LAGGING = 'lagging'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FeedCacheTest(MyTestCase):
+    def test_index_is_served_from_cache_until_write(self):
+        """Главная отдаётся из кеша, пока не появится новый пост."""
+        index = reverse('posts:index')
+        self.guest_client.get(index)
+        with self.assertNumQueries(0):
+            cached = self.guest_client.get(index)
+        self.assertIsNone(cached.context)
+        Post.objects.create(author=self.author, text='свежий пост')
+        response = self.guest_client.get(index)
+        self.assertContains(response, 'свежий пост')
+
+    def test_group_pages_follow_post_moves(self):
+        """Перенос поста в другую группу обновляет страницы обеих групп."""
+        old = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        new = reverse('posts:group_list',
+                      kwargs={'slug': self.group_new.slug})
+        self.guest_client.get(old)
+        self.guest_client.get(new)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': self.post.text, 'group': self.group_new.id})
+        self.assertNotIn(self.post,
+                         self.guest_client.get(old).context['page_obj'])
+        self.assertIn(self.post,
+                      self.guest_client.get(new).context['page_obj'])
+
+    def test_follow_page_changes_after_follow(self):
+        """Подписка сразу меняет закешированную ленту подписок."""
+        follow = reverse('posts:follow_index')
+        response = self.client_not_author.get(follow)
+        self.assertEqual(len(response.context['page_obj']), 0)
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client_not_author.get(follow)
+        self.assertIn(self.post, response.context['page_obj'])
+
+    def test_pages_are_cached_per_user(self):
+        """Разные пользователи не получают чужую закешированную страницу."""
+        index = reverse('posts:index')
+        self.client_not_author.get(index)
+        response = self.authorized_client.get(index)
+        self.assertContains(response, f'Пользователь: {self.author}')
+
+    def test_post_card_is_cached_until_edit(self):
+        """Карточка поста берётся из кеша, пока пост не отредактируют."""
+        index = reverse('posts:index')
+        self.guest_client.get(index)
+        Post.objects.filter(pk=self.post.pk).update(text='тихая правка')
+        feed_cache.bump(feed_cache.INDEX)
+        response = self.guest_client.get(index)
+        self.assertNotContains(response, 'тихая правка')
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'новый текст', 'group': self.group.id})
+        self.assertContains(self.guest_client.get(index), 'новый текст')
+        profile = reverse('posts:profile', kwargs={'username': self.author})
+        self.assertContains(self.guest_client.get(profile), 'новый текст')
+
+    def test_renamed_author_and_group_are_shown(self):
+        """Переименование автора или группы видно в карточках и объектах
+        постов из кеша, хотя сами посты не менялись."""
+        index = reverse('posts:index')
+        for client in (self.guest_client, self.client_not_author):
+            client.get(index)
+        self.author.first_name, self.author.last_name = 'Новое', 'Имя'
+        self.author.save()
+        self.group.title = 'переименованная группа'
+        self.group.save()
+        for client in (self.guest_client, self.client_not_author):
+            with self.subTest(client=client):
+                response = client.get(index)
+                self.assertContains(response, 'Автор: Новое Имя')
+                self.assertContains(response, 'переименованная группа')
+                post = response.context['page_obj'][0]
+                self.assertEqual(post.author.get_full_name(), 'Новое Имя')
+
+    def test_feeds_share_post_objects(self):
+        """Лента хранит массивы id, а объекты постов общие для всех лент."""
+        ids, stamps = feed_cache.feed_ids([feed_cache.INDEX],
+                                          Post.objects.all())
+        self.assertIsInstance(ids, array)
+        self.assertEqual(list(ids), list(
+            Post.objects.values_list('pk', flat=True)))
+        self.authorized_client.get(reverse('posts:index'))
+        group = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        with self.assertNumQueries(4):
+            # Сессия, пользователь, группа и список id её ленты; сам пост
+            # уже в кеше после главной.
+            response = self.client_not_author.get(group)
+        self.assertIn(self.post, response.context['page_obj'])
+
+    def test_cached_posts_carry_no_author_credentials(self):
+        """В кеш объектов постов не попадают пароль и почта автора."""
+        author = User.objects.create_user(
+            username='writer', email='writer@yatube.ru', password='secret')
+        post = Post.objects.create(author=author, text='пост автора')
+        self.guest_client.get(reverse('posts:index'))
+        post.refresh_from_db()
+        cached, _ = cache.get(feed_cache._object_key(
+            post.pk, feed_cache._stamp(post.updated_at)))
+        self.assertEqual(cached.author.username, author.username)
+        dumped = pickle.dumps(cached)
+        self.assertNotIn(author.password.encode(), dumped)
+        self.assertNotIn(author.email.encode(), dumped)
+
+    def test_deep_pages_fall_back_to_database(self):
+        """Страницы за пределами закешированного списка читаются из базы."""
+        Post.objects.bulk_create(Post(author=self.author, text=f'пост {n}')
+                                 for n in range(25))
+        expected = list(Post.objects.values_list('pk', flat=True))
+        seen = []
+        cursor = ''
+        with mock.patch.object(feed_cache, 'FEED_IDS_LIMIT', 15):
+            while True:
+                page_obj = self.authorized_client.get(
+                    reverse('posts:index'),
+                    {'cursor': cursor}).context['page_obj']
+                seen += [post.pk for post in page_obj]
+                if not page_obj.has_next():
+                    break
+                cursor = page_obj.next_cursor
+            back = self.authorized_client.get(
+                reverse('posts:index'),
+                {'cursor': page_obj.previous_cursor}).context['page_obj']
+        self.assertEqual(seen, expected)
+        self.assertEqual([post.pk for post in back], expected[10:20])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, DATABASE_REPLICAS=[LAGGING])
+class LaggingReplicaTest(TransactionTestCase):
+    databases = {'default', LAGGING}
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases[LAGGING] = dict(
+            connections.databases['default'], NAME=cls.replica_path)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[LAGGING].close()
+        del connections.databases[LAGGING]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+
+    def lag(self):
+        """Копирует основную базу в реплику, которая дальше не обновляется."""
+        connections[LAGGING].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connection.connection.backup(replica)
+        replica.close()
+
+    def test_feeds_are_not_cached_from_lagging_replica(self):
+        """Ленты, собранные после записи, не берутся с отстающей реплики:
+        новый пост сразу видят и гости, и автор после чтения ленты
+        другим пользователем."""
+        author = User.objects.create_user(username='auth')
+        Post.objects.create(author=author, text='старый пост')
+        self.lag()
+        guest, reader, writer = Client(), Client(), Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        writer.force_login(author)
+        index = reverse('posts:index')
+        self.assertContains(guest.get(index), 'старый пост')
+        writer.post(reverse('posts:post_create'), {'text': 'свежий пост'})
+        self.assertFalse(Post.objects.using(LAGGING).filter(
+            text='свежий пост').exists())
+        self.assertContains(guest.get(index), 'свежий пост')
+        reader.get(index)
+        self.assertContains(writer.get(index), 'свежий пост')
@@ -1,6 +1,10 @@
+import io
+
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
 from django.urls import reverse
+from PIL import Image
 from ..forms import PostForm
 from ..models import Post, Comment, Follow
 from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
@@ -35,6 +39,18 @@ class PostCreateFormTests(MyTestCase):
         self.assertEqual(last.author, self.post.author)
         self.assertIsNotNone(last.image)
 
+    def test_large_upload_is_downscaled_before_storage(self):
+        """Слишком большой оригинал уменьшается до сохранения."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (4000, 1000), 'blue').save(buffer, 'JPEG')
+        upload = SimpleUploadedFile('big.jpg', buffer.getvalue(),
+                                    'image/jpeg')
+        with self.assertLogs('yatube.uploads'):
+            self.authorized_client.post(reverse('posts:post_create'),
+                                        {'text': 'большая', 'image': upload})
+        post = Post.objects.get(text='большая')
+        self.assertEqual((post.image.width, post.image.height), (2560, 640))
+
     def test_edit_post(self):
         """Форма загружает пост с номером id и позволяет его редактировать"""
         response = (self.authorized_client.
@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
-from ..models import Group, Post
+from ..models import EXCERPT_LENGTH, Group, Post
 
 User = get_user_model()
 
@@ -54,3 +54,19 @@ class PostModelTest(TestCase):
         for expected_object_name, str_function in str_object_dict.items():
             with self.subTest(expected_object_name=expected_object_name):
                 self.assertEqual(expected_object_name, str_function)
+
+    def test_excerpt_follows_text(self):
+        """excerpt пересчитывается при сохранении текста."""
+        post = Post.objects.create(author=self.user, text='слово ' * 100)
+        self.assertEqual(len(post.excerpt), EXCERPT_LENGTH)
+        self.assertTrue(post.excerpt.endswith('…'))
+        post.text = 'Короткий текст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Короткий текст')
+
+    def test_summaries_skip_text(self):
+        """Карточки лент не загружают полный текст."""
+        post = Post.objects.summaries().get(pk=self.post.pk)
+        self.assertIn('text', post.get_deferred_fields())
+        self.assertEqual(post.excerpt, self.post.text)
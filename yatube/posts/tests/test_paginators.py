@@ -0,0 +1,70 @@
+from django.test import override_settings
+from django.urls import reverse
+from ..models import Post
+from ..paginators import CursorPage, WindowedPage
+from .MyTestCase import MyTestCase, NUMBER_OF_POSTS_PER_PAGE, TEMP_MEDIA_ROOT
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CursorPaginatorTest(MyTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Post.objects.bulk_create(Post(author=cls.author,
+                                      text=f'пост {i}',
+                                      group=cls.group)
+                                 for i in range(24))
+        cls.index = reverse('posts:index')
+
+    def test_first_page_is_cursor_page(self):
+        """Первая страница ленты строится курсором без COUNT(*)."""
+        response = self.guest_client.get(self.index)
+        page_obj = response.context['page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertEqual(len(page_obj), NUMBER_OF_POSTS_PER_PAGE)
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+    def test_cursor_pages_cover_feed_in_order(self):
+        """Переход по курсорам вперёд проходит всю ленту по порядку."""
+        expected = list(Post.objects.values_list('pk', flat=True))
+        seen = []
+        cursor = ''
+        while True:
+            page_obj = self.guest_client.get(
+                self.index, {'cursor': cursor}).context['page_obj']
+            seen += [post.pk for post in page_obj]
+            if not page_obj.has_next():
+                break
+            cursor = page_obj.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает ту же страницу, что была до перехода."""
+        first = self.guest_client.get(self.index).context['page_obj']
+        second = self.guest_client.get(
+            self.index, {'cursor': first.next_cursor}).context['page_obj']
+        third = self.guest_client.get(
+            self.index, {'cursor': second.next_cursor}).context['page_obj']
+        back = self.guest_client.get(
+            self.index, {'cursor': third.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_previous())
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        first = self.guest_client.get(self.index).context['page_obj']
+        for cursor in ('не-курсор', 'eA', 'bjIwMjAtMDEtMDF8eA'):
+            with self.subTest(cursor=cursor):
+                page_obj = self.guest_client.get(
+                    self.index, {'cursor': cursor}).context['page_obj']
+                self.assertEqual(list(page_obj), list(first))
+
+    def test_page_number_links_still_work(self):
+        """Старые ссылки ?page= отдают классическую страницу с окном."""
+        page_obj = self.guest_client.get(
+            self.index, {'page': 2}).context['page_obj']
+        self.assertIsInstance(page_obj, WindowedPage)
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(list(page_obj.page_window), [1, 2, 3])
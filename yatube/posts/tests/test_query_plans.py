@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..models import Comment, Follow, Post
+from .. import timeline
+from ..views import COMMENTS_PER_PAGE
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def bad_steps(plan, allow_sort=False):
+    """Шаги плана с полным просмотром таблицы или сортировкой во временном
+    B-дереве."""
+    return [step for step in plan
+            if ('TEMP B-TREE' in step and not allow_sort)
+            or (step.startswith('SCAN') and ' USING ' not in step)]
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryPlanTest(MyTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'пост {number}')
+            for number in range(15))
+        Follow.objects.create(user=cls.user, author=cls.author)
+        timeline.rebuild(cls.user.pk)
+
+    def assertIndexed(self, url, allow_sort=False, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_not_author.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(
+                    bad_steps(query_plan(sql), allow_sort), [])
+        return response
+
+    def assertFeedIndexed(self, url, allow_sort=False):
+        response = self.assertIndexed(url, allow_sort)
+        cursor = response.context['page_obj'].next_cursor
+        self.assertIsNotNone(cursor)
+        self.assertIndexed(url, allow_sort, cursor=cursor)
+
+    def test_index_feed(self):
+        """Главная читает посты по индексу без сортировки."""
+        self.assertFeedIndexed(reverse('posts:index'))
+
+    def test_group_feed(self):
+        """Лента группы читает посты по индексу без сортировки."""
+        self.assertFeedIndexed(reverse('posts:group_list',
+                                       kwargs={'slug': self.group.slug}))
+
+    def test_profile_feed(self):
+        """Профиль читает посты автора по индексу без сортировки."""
+        self.assertFeedIndexed(reverse('posts:profile',
+                                       kwargs={'username': self.author}))
+
+    def test_follow_feed(self):
+        """Лента подписок читается по индексу без сортировки."""
+        self.assertFeedIndexed(reverse('posts:follow_index'))
+
+    def test_follow_feed_with_celebrity(self):
+        """Лента с постами популярного автора читается по индексам.
+
+        Она объединяет через OR два диапазона разных индексов (своя лента
+        и посты автора), поэтому сортировка во временном B-дереве здесь
+        неизбежна; полных просмотров таблиц быть не должно.
+        """
+        with mock.patch.object(timeline, 'FANOUT_LIMIT', 0):
+            self.assertFeedIndexed(reverse('posts:follow_index'),
+                                   allow_sort=True)
+
+    def test_post_comments(self):
+        """Комментарии поста читаются по индексу без сортировки."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author, text=f'ответ {n}')
+            for n in range(COMMENTS_PER_PAGE))
+        response = self.assertIndexed(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertIndexed(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            cursor=response.context['comments'].next_cursor)
+
+    def test_followers_lookup(self):
+        """Обратный поиск подписчиков автора идёт по индексу."""
+        queryset = Follow.objects.filter(author=self.author).values_list(
+            'user_id', flat=True)
+        self.assertEqual(bad_steps(query_plan(str(queryset.query))), [])
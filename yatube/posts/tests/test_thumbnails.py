@@ -0,0 +1,128 @@
+import io
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sorl.thumbnail import default
+from tasks.models import Job
+from .. import jobs, thumbnails, variants
+from ..models import Post
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(MyTestCase):
+    def test_feed_shows_placeholder_until_thumbnail_exists(self):
+        """Пока миниатюры нет, в ленте заглушка, после генерации - картинка."""
+        page = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.guest_client.get(page)
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, 'src="/media/cache/')
+        self.assertTrue(thumbnails.generate(self.post.image.name))
+        response = self.guest_client.get(page)
+        self.assertContains(response, 'src="/media/cache/')
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails готовит все размеры миниатюр."""
+        call_command('generate_thumbnails', workers=0,
+                     stdout=io.StringIO())
+        backend = thumbnails.DeferredThumbnailBackend()
+        for geometry, options in thumbnails.THUMBNAILS:
+            with self.subTest(geometry=geometry):
+                self.assertIsNotNone(backend.get_thumbnail(
+                    self.post.image.name, geometry, **options))
+
+    def test_thumbnail_job_refreshes_cached_cards(self):
+        """После генерации миниатюр карточка в ленте показывает картинку."""
+        index = reverse('posts:index')
+        self.assertNotContains(self.guest_client.get(index),
+                               'src="/media/cache/')
+        jobs.generate_thumbnails(self.post.image.name)
+        self.assertContains(self.guest_client.get(index),
+                            'src="/media/cache/')
+
+    def test_thumbnail_job_stamps_posts(self):
+        """Задача миниатюр записывает адрес и размеры миниатюры в пост, и
+        карточка обходится без хранилища sorl."""
+        jobs.generate_thumbnails(self.post.image.name)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.thumbnail_url.startswith('/media/cache/'))
+        self.assertEqual(
+            (self.post.thumbnail_width, self.post.thumbnail_height),
+            (960, 339))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'thumbnail_kvstore' in query['sql']])
+
+    def test_feed_prefetches_thumbnails_in_one_query(self):
+        """Записи миниатюр постов без отметки читаются одним запросом."""
+        for number in range(3):
+            Post.objects.create(
+                author=self.author, text=f'пост {number}',
+                image=SimpleUploadedFile(f'small{number}.gif',
+                                         self.small_gif, 'image/gif'))
+        for name in Post.objects.values_list('image', flat=True):
+            self.assertTrue(thumbnails.generate(name))
+        cache.clear()
+        thumbnails._index.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'src="/media/cache/', count=4)
+        self.assertEqual(len([query for query in queries.captured_queries
+                              if 'thumbnail_kvstore' in query['sql']]), 1)
+
+    def test_thumbnail_job_creates_variants(self):
+        """Задача миниатюр нарезает варианты всех ширин, а карточка
+        отдаёт их через srcset."""
+        jobs.generate_thumbnails(self.post.image.name)
+        self.post.refresh_from_db()
+        expected = [(mime, width) for width in variants.WIDTHS
+                    for _, mime, _ in variants.formats()]
+        self.assertIn(('image/webp', 320), expected)
+        self.assertEqual([source[0] for source in self.post.image_sources],
+                         [mime for _, mime, _ in variants.formats()])
+        response = self.authorized_client.get(reverse('posts:index'))
+        for mime, width in expected:
+            with self.subTest(mime=mime, width=width):
+                self.assertContains(response, f'-{width}w.')
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'sizes="(min-width: 992px) 960px')
+
+    def test_reupload_shares_file_until_last_post_is_deleted(self):
+        """Повторная загрузка картинки не создаёт копию, а файл удаляется
+        только вместе с последним постом, который на него ссылается."""
+        # Своя картинка: файл картинки self.post общий для всех тестов.
+        picture = self.small_gif.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+        post, repost = (Post.objects.create(
+            author=self.author, text=f'пост {number}',
+            image=SimpleUploadedFile(f'{number}.gif', picture, 'image/gif'))
+            for number in range(2))
+        name = post.image.name
+        self.assertEqual(repost.image.name, name)
+        jobs.generate_thumbnails(name)
+        post.refresh_from_db()
+        storage = Post._meta.get_field('image').storage
+        thumbnail = post.thumbnail_url.replace('/media/', '', 1)
+        repost.delete()
+        job = Job.objects.get(name=jobs.release_image.task_name)
+        self.assertGreater(job.run_after, timezone.now())
+        with mock.patch('core.storage.RELEASE_GRACE', 0):
+            self.assertFalse(thumbnails.release(name))
+            self.assertTrue(storage.exists(name))
+            post.delete()
+            self.assertTrue(thumbnails.release(name))
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(storage.exists(thumbnail))
+        self.assertFalse(storage.exists(
+            variants.variant_name(name, 320, 'WEBP')))
+
+    def tearDown(self):
+        default.kvstore.clear()
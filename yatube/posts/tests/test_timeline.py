@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from tasks import queue
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry
+from .MyTestCase import MyTestCase, TEMP_MEDIA_ROOT, User
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TimelineTest(MyTestCase):
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту постами автора, отписка чистит её."""
+        self.client_not_author.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.client_not_author.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.post(reverse('posts:post_create'),
+                                    data={'text': 'пост для ленты'})
+        post = Post.objects.get(text='пост для ленты')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        response = self.client_not_author.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_feed_pages_ignore_other_readers(self):
+        """Страницы ленты не дублируют посты из чужих лент."""
+        other = User.objects.create_user(username='other_reader')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        Post.objects.bulk_create(Post(author=self.author, text=f'пост {n}')
+                                 for n in range(14))
+        for reader in (self.user, other):
+            timeline.rebuild(reader.pk)
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            page_obj = self.client_not_author.get(
+                reverse('posts:follow_index'),
+                {'cursor': cursor}).context['page_obj']
+            seen.extend(page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+    def test_celebrity_posts_are_merged_on_read(self):
+        """Посты авторов с огромной аудиторией подмешиваются при чтении."""
+        with mock.patch.object(timeline, 'FANOUT_LIMIT', 0):
+            Follow.objects.create(user=self.user, author=self.author)
+            post = Post.objects.create(author=self.author, text='звезда')
+            self.assertFalse(TimelineEntry.objects.exists())
+            response = self.client_not_author.get(
+                reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        self.assertIn(self.post, response.context['page_obj'])
+
+    def test_former_celebrity_posts_stay_in_feeds(self):
+        """Когда автор опускается до порога, его посты, написанные за
+        порогом, дописываются в ленты, а не пропадают из них."""
+        other = User.objects.create_user(username='other_reader')
+        with mock.patch.object(timeline, 'FANOUT_LIMIT', 1):
+            Follow.objects.create(user=self.user, author=self.author)
+            Follow.objects.create(user=other, author=self.author)
+            post = Post.objects.create(author=self.author, text='звезда')
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            Follow.objects.filter(user=other).delete()
+            self.assertIn(post, self.client_not_author.get(
+                reverse('posts:follow_index')).context['page_obj'])
+            while queue.work_once() is not None:
+                pass
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=self.user, post=post).exists())
+            self.assertEqual(timeline.celebrity_ids(self.user), [])
+        response = self.client_not_author.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
@@ -22,6 +22,15 @@ class PostViewTest(MyTestCase):
             self.assertEqual(first_obj.group, self.post.group)
             self.assertEqual(first_obj.image, self.post.image)
 
+    def test_feed_pages_do_not_load_full_text(self):
+        """Ленты загружают excerpt вместо полного текста поста."""
+        for page in self.pages_list:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                for post in response.context['page_obj']:
+                    self.assertIn('text', post.get_deferred_fields())
+                    self.assertContains(response, post.excerpt)
+
     def test_post_detail_page_show_correct_context(self):
         """Шаблон task_detail сформирован с правильным контекстом."""
         response = (self.authorized_client.
@@ -0,0 +1,219 @@
+"""Фоновая подготовка миниатюр постов.
+
+Шаблоны не режут картинки в запросе: DeferredThumbnailBackend отдаёт
+только готовые миниатюры, а для остальных ставит задачу в очередь
+(tasks) и возвращает None, чтобы тег {% thumbnail %} показал заглушку.
+Вместе с миниатюрами создаются варианты картинки для srcset (см.
+variants). Готовая миниатюра карточки и описания вариантов
+записываются в сам пост (stamp), и лентам
+не нужно искать её в хранилище sorl. Для постов без отметки
+BulkKVStore достаёт записи всей страницы одним запросом (prefetch).
+"""
+import json
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.storage import RELEASE_GRACE
+
+from . import variants
+from .models import Post
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Миниатюра карточки поста, которую stamp() записывает в Post.
+CARD = THUMBNAILS[0]
+INDEX_MAX_ENTRIES = 10000
+
+# Найденные записи хранилища миниатюр в памяти процесса. Ключ записи
+# выводится из имени картинки и параметров миниатюры, поэтому
+# однажды найденная запись не устаревает; отсутствие записи здесь не
+# запоминается - миниатюру может создать другой процесс.
+_index = {}
+_index_lock = threading.Lock()
+
+
+class BulkKVStore(KVStore):
+    """Хранилище миниатюр sorl: память процесса, затем общий кеш Django,
+    затем таблица thumbnail_kvstore."""
+
+    def _remember(self, values):
+        with _index_lock:
+            if len(_index) + len(values) > INDEX_MAX_ENTRIES:
+                _index.clear()
+            _index.update(values)
+
+    def _forget(self, keys):
+        with _index_lock:
+            for key in keys:
+                _index.pop(key, None)
+
+    def prefetch(self, image_files):
+        """Загружает записи нескольких картинок: один get_many из кеша
+        и один запрос к базе на все промахи."""
+        keys = {add_prefix(image_file.key) for image_file in image_files}
+        missing = [key for key in keys if key not in _index]
+        if not missing:
+            return
+        found = self.cache.get_many(missing)
+        rest = [key for key in missing if key not in found]
+        if rest:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=rest).values_list('key', 'value'))
+            self.cache.set_many(
+                {key: stored.get(key, EMPTY_VALUE) for key in rest},
+                sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(stored)
+        self._remember({key: value for key, value in found.items()
+                        if value != EMPTY_VALUE})
+
+    def _get_raw(self, key):
+        value = _index.get(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                self._remember({key: value})
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember({key: value})
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._forget(keys)
+
+    def clear(self, delete_thumbnails=False):
+        with _index_lock:
+            _index.clear()
+        super().clear(delete_thumbnails)
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    def get_thumbnail(self, file_, geometry_string, **options):
+        # Ключ миниатюры зависит от хранилища исходника: картинку поста
+        # всегда описываем через хранилище sorl, как при генерации, хотя
+        # у поля оно своё (см. core.storage).
+        source = ImageFile(getattr(file_, 'name', file_))
+        cached = default.kvstore.get(
+            self.thumbnail_file(source, geometry_string, options))
+        if cached:
+            return cached
+        schedule(source.name)
+        return None
+
+    def thumbnail_file(self, source, geometry_string, options):
+        """ImageFile, под которым миниатюра лежит в хранилище sorl."""
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._full_options(source, options))
+        return ImageFile(name, default.storage)
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _full_options(self, source, options):
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def process_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker)
+
+
+def generate(name):
+    """Создаёт все миниатюры и варианты картинки; выполняется вне
+    запроса. Возвращает описания вариантов или None при ошибке."""
+    try:
+        for geometry, options in THUMBNAILS:
+            DeferredThumbnailBackend().generate(name, geometry, **options)
+        return variants.generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+        return None
+
+
+def prefetch(posts):
+    """Загружает записи миниатюр карточек для постов без отметки."""
+    names = {post.image.name for post in posts
+             if post.image and not post.thumbnail_url}
+    if names and hasattr(default.kvstore, 'prefetch'):
+        backend = DeferredThumbnailBackend()
+        geometry, options = CARD
+        default.kvstore.prefetch([
+            backend.thumbnail_file(ImageFile(name), geometry, options)
+            for name in names])
+
+
+def stamp(name, image_variants=()):
+    """Записывает адрес и размеры готовой миниатюры карточки и варианты
+    картинки в посты с картинкой name. Возвращает число обновлённых
+    постов."""
+    geometry, options = CARD
+    thumbnail = DeferredThumbnailBackend().generate(name, geometry,
+                                                    **options)
+    width, height = thumbnail.size
+    # Карточки постов кешируются по updated_at: новая дата сменит заглушку
+    # на миниатюру.
+    return Post.objects.filter(image=name).update(
+        thumbnail_url=thumbnail.url, thumbnail_width=width,
+        thumbnail_height=height,
+        image_variants=json.dumps(list(image_variants)),
+        updated_at=timezone.now())
+
+
+def release(name):
+    """Удаляет картинку вместе с миниатюрами и вариантами, если на неё
+    больше не ссылается ни один пост. Возвращает True, если удалила."""
+    storage = Post._meta.get_field('image').storage
+    referenced = Post.objects.filter(image=name).exists
+    if not (hasattr(storage, 'release')
+            and storage.release(name, referenced)):
+        return False
+    default.kvstore.delete(ImageFile(name))
+    variants.delete(name)
+    return True
+
+
+def schedule(name):
+    if name:
+        from .jobs import generate_thumbnails
+        generate_thumbnails.delay(name)
+
+
+def schedule_release(name):
+    """Освобождает картинку не раньше, чем истечёт отсрочка хранилища:
+    та же картинка могла только что прийти в новом, ещё не сохранённом
+    посте."""
+    from .jobs import release_image
+    release_image.delay_in(RELEASE_GRACE, name)
@@ -0,0 +1,140 @@
+"""Материализованные ленты подписок (fan-out on write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+follow_index читает одну ленту пользователя по индексу, а не соединяет
+Post и Follow на каждом запросе. Авторы, у которых подписчиков больше
+TIMELINE_FANOUT_LIMIT, в ленты не раскладываются: их посты
+подмешиваются при чтении, чтобы один пост не порождал лавину записей.
+
+Подмешиваются авторы с флагом Counters.celebrity. Он ставится, как
+только подписчиков становится больше порога, а снимается, когда
+автор опустился до порога, только после того, как фоновая задача
+дописала его посты в ленты всех подписчиков: иначе посты, написанные
+за порогом, пропали бы из лент.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Counters, Follow, Post, TimelineEntry
+from .paginators import POST_KEYS
+
+
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 1000)
+INLINE_LIMIT = getattr(settings, 'TIMELINE_INLINE_FANOUT', 100)
+BATCH_SIZE = 500
+TIMELINE_KEYS = ('pub_date', 'post_id')
+
+
+def followers_of(author_id):
+    return Counters.objects.filter(user_id=author_id).values_list(
+        'followers', flat=True).first() or 0
+
+
+def is_celebrity(author_id):
+    return followers_of(author_id) > FANOUT_LIMIT
+
+
+def celebrity_ids(user):
+    return list(Follow.objects.filter(
+        user=user, author__counters__celebrity=True
+    ).values_list('author_id', flat=True))
+
+
+def sync_celebrity(author_id):
+    """Отмечает переход автора через FANOUT_LIMIT после подписки или
+    отписки."""
+    flagged = Counters.objects.filter(user_id=author_id, celebrity=True)
+    if is_celebrity(author_id):
+        Counters.objects.filter(user_id=author_id,
+                                celebrity=False).update(celebrity=True)
+    elif flagged.exists():
+        from .jobs import resume_fan_out
+        resume_fan_out.delay(author_id)
+
+
+def resume_fan_out(author_id):
+    """Дописывает посты автора в ленты всех подписчиков и перестаёт
+    подмешивать его при чтении. False, если автор снова за порогом."""
+    if is_celebrity(author_id):
+        return False
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'author_id', 'pub_date')[:BACKFILL_LIMIT])
+    readers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(readers.iterator(), posts),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    Counters.objects.filter(user_id=author_id).update(celebrity=False)
+    return True
+
+
+def _entries(user_ids, posts):
+    return (TimelineEntry(user_id=user_id, post_id=pk,
+                          author_id=author_id, pub_date=pub_date)
+            for user_id in user_ids
+            for pk, author_id, pub_date in posts)
+
+
+def fan_out(post, inline=False):
+    """Большие раздачи уходят в фоновую очередь, мелкие идут сразу."""
+    followers = followers_of(post.author_id)
+    if followers > FANOUT_LIMIT:
+        return
+    if followers > INLINE_LIMIT and not inline:
+        from .jobs import fan_out_post
+        fan_out_post.delay(post.pk)
+        return
+    readers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        _entries(readers, [(post.pk, post.author_id, post.pub_date)]),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'author_id', 'pub_date')[:BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        _entries([user_id], posts),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(
+        user_id=user_id).values_list('author_id', flat=True)
+    for author_id in authors:
+        backfill(user_id, author_id)
+
+
+def follow_feed(user):
+    """Лента подписок и ключи курсора для её пагинации.
+
+    Обычно это записи TimelineEntry самого читателя: страница берётся одним
+    проходом по индексу timeline_feed_idx, посты приходят через
+    select_related (см. feed_posts). Посты популярных авторов в ленты не
+    раскладываются, поэтому для их подписчиков лента собирается из Post.
+    """
+    celebrities = celebrity_ids(user)
+    if not celebrities:
+        return (TimelineEntry.objects.filter(user=user).select_related(
+            'post__author', 'post__group').defer('post__text'),
+            TIMELINE_KEYS)
+    own = TimelineEntry.objects.filter(user=user).values('post')
+    return (Post.objects.summaries().filter(
+        Q(pk__in=own) | Q(author__in=celebrities)).select_related(
+        'author', 'group'), POST_KEYS)
+
+
+def feed_posts(items):
+    """Посты страницы ленты, из каких бы объектов она ни состояла."""
+    return [item.post if isinstance(item, TimelineEntry) else item
+            for item in items]
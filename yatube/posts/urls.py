@@ -16,5 +16,7 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
     path('follow/', views.follow_index, name='follow_index')
 ]
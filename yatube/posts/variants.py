@@ -0,0 +1,98 @@
+"""Варианты картинок постов для srcset.
+
+Из картинки поста один раз (в фоне, вместе с миниатюрами sorl)
+нарезаются кадры с пропорциями карточки 960x339 шириной WIDTHS
+в современных форматах FORMATS. Форматы, которые не умеет сохранять
+установленный Pillow (AVIF - только с плагином), пропускаются, а
+браузер получает JPEG-миниатюру карточки из <img>.
+"""
+import io
+import json
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+WIDTHS = (320, 640, 960)
+RATIO = 339 / 960
+# В порядке предпочтения: браузер берёт первый <source>, который знает.
+FORMATS = (
+    ('AVIF', 'image/avif', {'quality': 50}),
+    ('WEBP', 'image/webp', {'quality': 75, 'method': 4}),
+)
+ROOT = 'cache/variants'
+
+
+def formats():
+    """Форматы из FORMATS, которые может сохранить Pillow."""
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[0] in Image.SAVE]
+
+
+def variant_name(name, width, fmt):
+    stem = os.path.splitext(name)[0]
+    return f'{ROOT}/{stem}-{width}w.{fmt.lower()}'
+
+
+def generate(name, storage=default_storage):
+    """Создаёт варианты картинки name и возвращает их описания:
+    [{'type', 'width', 'height', 'url', 'size'}, ...]. Имя картинки
+    определяется её содержимым, поэтому готовые варианты не устаревают
+    и повторная загрузка той же картинки их не пересоздаёт."""
+    source = None
+    variants = []
+    for width in WIDTHS:
+        size = (width, round(width * RATIO))
+        frame = None
+        for fmt, mime, options in formats():
+            path = variant_name(name, width, fmt)
+            if not storage.exists(path):
+                if source is None:
+                    source = _open(name, storage)
+                if frame is None:
+                    frame = ImageOps.fit(source, size, Image.LANCZOS)
+                buffer = io.BytesIO()
+                frame.save(buffer, fmt, **options)
+                path = storage.save(path, ContentFile(buffer.getvalue()))
+            variants.append({'type': mime, 'width': size[0],
+                             'height': size[1], 'url': storage.url(path),
+                             'size': storage.size(path)})
+    return variants
+
+
+def _open(name, storage):
+    with storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    return image
+
+
+def delete(name, storage=default_storage):
+    for width in WIDTHS:
+        for fmt, _, _ in FORMATS:
+            storage.delete(variant_name(name, width, fmt))
+
+
+def sources(variants):
+    """Пары (MIME-тип, srcset) для <source> в порядке FORMATS."""
+    if isinstance(variants, str):
+        try:
+            variants = json.loads(variants) if variants else []
+        except ValueError:
+            variants = None
+    if not isinstance(variants, list):
+        # Битое описание не должно ломать страницу: остаётся <img>.
+        variants = []
+    result = []
+    for _, mime, _ in FORMATS:
+        srcset = ', '.join(f'{variant["url"]} {variant["width"]}w'
+                           for variant in variants
+                           if variant['type'] == mime)
+        if srcset:
+            result.append((mime, srcset))
+    return result
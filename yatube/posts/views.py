@@ -1,26 +1,54 @@
+from http import HTTPStatus
+
 from django.shortcuts import render, get_object_or_404
-from django.views.decorators.cache import cache_page
-from .models import Post, Group, User, Follow
+from .models import Comment, Post, Group, User, Follow
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import redirect
+from . import counters, thumbnails
+from .feed_cache import (cache_guest_page, feed_page, follow_feeds,
+                         group_feeds, index_feeds, profile_feeds)
 from .forms import PostForm, CommentForm
+from .paginators import (CursorPaginator, WindowedPaginator,
+                         POST_KEYS, cursor_ordering)
+from .timeline import feed_posts, follow_feed
 
 
 NUMBER_OF_POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+COMMENT_KEYS = ('created', 'pk')
 
 
-def paginator_page(request, posts):
+def paginator_page(request, posts, keys=POST_KEYS, feeds=None):
+    """Страница ленты: по номеру (?page=), по курсору из закешированного
+    списка id ленты feeds или курсором по базе."""
     page_number = request.GET.get('page')
-    paginator = Paginator(posts, NUMBER_OF_POSTS_PER_PAGE)
-    return paginator.get_page(page_number)
-
-
-@cache_page(20, key_prefix='index_page')
+    if page_number is not None:
+        paginator = WindowedPaginator(
+            posts.order_by(*cursor_ordering(keys)),
+            NUMBER_OF_POSTS_PER_PAGE)
+        return paginator.get_page(page_number)
+    if feeds:
+        return feed_page(request.GET.get('cursor'), feeds, posts,
+                         NUMBER_OF_POSTS_PER_PAGE, keys)
+    paginator = CursorPaginator(posts, NUMBER_OF_POSTS_PER_PAGE, keys=keys)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def comments_page(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE,
+                                keys=COMMENT_KEYS)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@cache_guest_page(index_feeds)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.select_related('author', 'group')
-    page_obj = paginator_page(request, posts)
+    posts = Post.objects.summaries().select_related('author', 'group')
+    page_obj = paginator_page(request, posts, feeds=index_feeds(request))
+    thumbnails.prefetch(page_obj)
     following = False
     if request.user.is_authenticated:
         following = request.user.follower.exists()
@@ -30,27 +58,35 @@ def index(request):
     return render(request, template, context)
 
 
+@cache_guest_page(group_feeds)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author', 'group')
-    page_obj = paginator_page(request, posts)
+    posts = group.posts.summaries().select_related('author', 'group')
+    page_obj = paginator_page(request, posts,
+                              feeds=group_feeds(request, slug))
+    thumbnails.prefetch(page_obj)
     context = {'group': group,
                'posts': posts,
                'page_obj': page_obj}
     return render(request, template, context)
 
 
+@cache_guest_page(profile_feeds)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = paginator_page(request, posts)
+    author = get_object_or_404(User.objects.select_related('counters'),
+                               username=username)
+    posts = author.posts.summaries().select_related('author', 'group')
+    page_obj = paginator_page(request, posts,
+                              feeds=profile_feeds(request, author.username))
+    thumbnails.prefetch(page_obj)
     following = False
     if request.user.is_authenticated and request.user != author:
         following = author.following.exists()
     context = {'posts': posts,
                'author': author,
+               'counters': counters.for_user(author),
                'page_obj': page_obj,
                'following': following}
     return render(request, template, context)
@@ -58,15 +94,23 @@ def profile(request, username):
 
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id)
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('author')
     context = {'post': post,
-               'comments': comments,
+               'author_counters': counters.for_user(post.author),
+               'comments': comments_page(request, post.pk),
                'form': form}
     return render(request, template, context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста HTML-фрагментом."""
+    context = {'post_id': post_id,
+               'comments': comments_page(request, post_id)}
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
@@ -75,7 +119,10 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+        if post.image:
+            thumbnails.schedule(post.image.name)
         return redirect('posts:profile', username=request.user)
     return render(request, template, context)
 
@@ -89,7 +136,11 @@ def post_edit(request, post_id):
     if request.user != post.author:
         return redirect('posts:post_detail', post_id=post_id)
     if form.is_valid():
-        form.save()
+        if 'image' in form.changed_data:
+            post.clear_thumbnail()
+        post = form.save()
+        if post.image and 'image' in form.changed_data:
+            thumbnails.schedule(post.image.name)
         return redirect('posts:post_detail', post_id=post_id)
     context = {'form': form,
                'post': post,
@@ -105,18 +156,25 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+        if request.is_ajax():
+            return render(request, 'posts/includes/comment.html',
+                          {'comment': comment}, status=HTTPStatus.CREATED)
+    elif request.is_ajax():
+        return render(request, 'posts/includes/comment_form.html',
+                      {'form': form}, status=HTTPStatus.BAD_REQUEST)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related(
-        'author', 'group').filter(
-        author__following__user=request.user)
-    page_obj = paginator_page(request, posts)
-    context = {'posts': posts,
-               'page_obj': page_obj}
+    feed, keys = follow_feed(request.user)
+    page_obj = paginator_page(request, feed, keys,
+                              feeds=follow_feeds(request.user.pk, feed))
+    page_obj.object_list = feed_posts(page_obj.object_list)
+    thumbnails.prefetch(page_obj)
+    context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
@@ -126,14 +184,16 @@ def profile_follow(request, username):
     follower = Follow.objects.filter(user=request.user,
                                      author=author)
     if author != request.user and not follower.exists():
-        Follow.objects.get_or_create(user=request.user,
-                                     author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user,
+                                         author=author)
     return redirect('posts:profile', username=author)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user,
-                          author=author).delete()
+    with transaction.atomic():
+        Follow.objects.filter(user=request.user,
+                              author=author).delete()
     return redirect('posts:profile', username=username)
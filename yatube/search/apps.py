@@ -0,0 +1,11 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_migrate
+
+
+class SearchConfig(AppConfig):
+    name = 'search'
+
+    def ready(self):
+        from . import index
+        post_migrate.connect(index.install_on_migrate,
+                             sender=apps.get_app_config('posts'))
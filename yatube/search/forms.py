@@ -0,0 +1,5 @@
+from django import forms
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Поиск по постам', max_length=200)
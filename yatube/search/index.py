@@ -0,0 +1,124 @@
+"""Полнотекстовый индекс постов на SQLite FTS5.
+
+Индекс - виртуальная таблица с внешним содержимым (content=posts_post),
+которую синхронизируют триггеры. Django пересоздаёт таблицу posts_post
+при миграциях SQLite и теряет её триггеры, поэтому install() выполняется
+после каждой миграции и ничего не делает, если всё уже на месте.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from posts.models import Post
+
+
+TABLE = 'search_post_fts'
+SNIPPET_TOKENS = 24
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {TABLE}({TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+]
+
+
+def available(using=None):
+    return (connections[using] if using else connection).vendor == 'sqlite'
+
+
+def install(using='default', rebuild=False):
+    if not available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT 1 FROM sqlite_master WHERE name = %s',
+                       [TABLE])
+        created = cursor.fetchone() is None
+        for statement in INSTALL_SQL:
+            cursor.execute(statement)
+        if created or rebuild:
+            cursor.execute(
+                f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def install_on_migrate(sender, using='default', **kwargs):
+    install(using)
+
+
+def match_expression(text):
+    """Слова запроса -> безопасное выражение MATCH с поиском по префиксу."""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids(text):
+    """Подзапрос с id подходящих постов (для фильтров, например в админке)."""
+    return RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+                  [match_expression(text)])
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>')
+                     .replace(MARK_END, '</mark>'))
+
+
+class SearchResults:
+    """Ленивая выборка результатов для Paginator: COUNT и LIMIT/OFFSET
+    выполняются по индексу, посты подтягиваются одним запросом."""
+
+    def __init__(self, text):
+        self.expression = match_expression(text)
+
+    def count(self):
+        if not self.expression:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.expression])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults supports only slicing')
+        start = index.start or 0
+        if not self.expression or index.stop is None or index.stop <= start:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""SELECT rowid, snippet({TABLE}, 0, %s, %s, '…', %s)
+                    FROM {TABLE} WHERE {TABLE} MATCH %s
+                    ORDER BY rank LIMIT %s OFFSET %s""",
+                [MARK_START, MARK_END, SNIPPET_TOKENS, self.expression,
+                 index.stop - start, start])
+            rows = cursor.fetchall()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            if pk in posts:
+                posts[pk].snippet = highlight(snippet)
+                results.append(posts[pk])
+        return results
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Post
+from .index import SearchResults
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Война и мир: первый <b>том</b>')
+        Post.objects.create(author=cls.user, text='Анна Каренина')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_search_finds_and_highlights(self):
+        """Поиск находит пост по слову и подсвечивает совпадение."""
+        response = self.guest_client.get(reverse('search:search'),
+                                         {'q': 'мир'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), [self.post])
+        self.assertIn('<mark>мир</mark>', page_obj[0].snippet)
+        self.assertIn('&lt;b&gt;', page_obj[0].snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.create(author=self.user, text='Детство')
+        post.text = 'Воскресение'
+        post.save()
+        self.assertEqual(SearchResults('детство').count(), 0)
+        self.assertEqual(SearchResults('воскрес').count(), 1)
+        post.delete()
+        self.assertEqual(SearchResults('воскрес').count(), 0)
+
+    def test_query_operators_are_not_interpreted(self):
+        """Спецсимволы FTS5 в запросе не ломают поиск."""
+        for query in ('"', 'мир OR', 'NEAR(', '***'):
+            with self.subTest(query=query):
+                response = self.guest_client.get(reverse('search:search'),
+                                                 {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        self.guest_client.force_login(self.admin)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'карен'})
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -0,0 +1,26 @@
+from urllib.parse import urlencode
+
+from django.shortcuts import render
+from posts.paginators import WindowedPaginator
+from .forms import SearchForm
+from .index import SearchResults
+
+
+NUMBER_OF_RESULTS_PER_PAGE = 10
+
+
+def search(request):
+    template = 'search/results.html'
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    query = ''
+    if form.is_valid():
+        query = form.cleaned_data['q']
+        paginator = WindowedPaginator(SearchResults(query),
+                                      NUMBER_OF_RESULTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    context = {'form': form,
+               'query': query,
+               'page_obj': page_obj,
+               'page_query': urlencode({'q': query}) if query else ''}
+    return render(request, template, context)
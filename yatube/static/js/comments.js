@@ -0,0 +1,61 @@
+// Подгрузка комментариев порциями и отправка нового без перезагрузки.
+document.addEventListener('click', function (event) {
+  var more = event.target.closest('[data-comments-more]');
+  if (!more) {
+    return;
+  }
+  event.preventDefault();
+  fetch(more.dataset.fragment)
+    .then(function (response) { return response.text(); })
+    .then(function (html) {
+      more.insertAdjacentHTML('afterend', html);
+      more.remove();
+    });
+});
+
+document.addEventListener('submit', function (event) {
+  var form = event.target;
+  if (!form.matches('[data-comment-form]')) {
+    return;
+  }
+  event.preventDefault();
+  fetch(form.action, {
+    method: 'POST',
+    body: new FormData(form),
+    headers: {'X-Requested-With': 'XMLHttpRequest'},
+    credentials: 'same-origin'
+  }).then(function (response) {
+    if (response.status === 400) {
+      // Поля формы с ошибками проверки от сервера.
+      return response.text().then(function (html) {
+        showError(form, null);
+        form.querySelector('[data-comment-fields]').outerHTML = html;
+      });
+    }
+    if (response.status !== 201) {
+      form.submit();
+      return;
+    }
+    return response.text().then(function (html) {
+      document.getElementById('comments').insertAdjacentHTML('afterbegin', html);
+      var count = document.getElementById('comments-count');
+      count.textContent = Number(count.textContent) + 1;
+      form.reset();
+      showError(form, null);
+    });
+  }).catch(function () {
+    showError(form, 'Не удалось отправить комментарий. Проверьте соединение и попробуйте ещё раз.');
+  });
+});
+
+function showError(form, message) {
+  form.querySelectorAll('.alert').forEach(function (error) {
+    error.remove();
+  });
+  if (message) {
+    var error = document.createElement('div');
+    error.className = 'alert alert-danger';
+    error.textContent = message;
+    form.prepend(error);
+  }
+}
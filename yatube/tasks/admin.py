@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'attempts', 'run_after',
+                    'created', 'started', 'finished', 'worker')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('created', 'started', 'finished', 'worker',
+                       'heartbeat', 'last_error')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(Job, JobAdmin)
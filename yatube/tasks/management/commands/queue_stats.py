@@ -0,0 +1,17 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from tasks.stats import queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает глубину очереди задач и их задержки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=1000,
+                            help='Сколько последних задач учитывать')
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(queue_stats(options['window']),
+                                     indent=2, ensure_ascii=False))
@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+def work(poll_interval, once):
+    import django
+    django.setup()
+    from tasks import queue
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    queue.requeue_stale()
+    while not stopping:
+        close_old_connections()
+        result = queue.work_once()
+        if result is None:
+            if once:
+                return
+            queue.requeue_stale()
+            time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить накопившиеся задачи и выйти')
+
+    def handle(self, *args, **options):
+        arguments = (options['poll_interval'], options['once'])
+        if options['processes'] == 1:
+            return work(*arguments)
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=work, args=arguments)
+                   for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['name', 'status'], name='job_pending_idx'),
+        ),
+    ]
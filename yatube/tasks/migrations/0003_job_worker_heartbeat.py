@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_job_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Воркер жив на'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Воркер'),
+        ),
+    ]
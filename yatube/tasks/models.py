@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.TextField('Аргументы', default='{}')
+    status = models.CharField('Статус', max_length=10,
+                              choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток',
+                                                    default=5)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', null=True, blank=True)
+    worker = models.CharField('Воркер', max_length=100, blank=True)
+    heartbeat = models.DateTimeField('Воркер жив на', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ['-created']
+        indexes = [models.Index(fields=['status', 'run_after'],
+                                name='job_claim_idx'),
+                   models.Index(fields=['name', 'status'],
+                                name='job_pending_idx')]
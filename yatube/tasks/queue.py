@@ -0,0 +1,183 @@
+"""Простая надёжная очередь задач в базе данных.
+
+Задача - функция, помеченная @task в модуле jobs.py любого приложения.
+enqueue() пишет строку Job в текущей транзакции, поэтому задача не
+теряется и не выполняется раньше, чем закоммичены её данные.
+Воркеры (manage.py run_worker) забирают задачи атомарным UPDATE,
+а упавшие повторяют с экспоненциальной задержкой.
+
+Взятая задача помечена воркером и номером попытки, а пока она
+выполняется, воркер раз в HEARTBEAT_INTERVAL обновляет heartbeat.
+requeue_stale() возвращает в очередь только задачи, чей воркер
+замолчал дольше STALE_AFTER, а исчерпавшие попытки помечает FAILED:
+задача, которая каждый раз убивает воркер, не крутится вечно. Итог
+run() записывает, только если задачу за это время не забрал другой
+воркер.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+ALWAYS_EAGER = getattr(settings, 'TASKS_ALWAYS_EAGER', False)
+BACKOFF_BASE = getattr(settings, 'TASKS_BACKOFF_BASE', 5)
+BACKOFF_MAX = getattr(settings, 'TASKS_BACKOFF_MAX', 60 * 60)
+STALE_AFTER = getattr(settings, 'TASKS_STALE_AFTER', 15 * 60)
+HEARTBEAT_INTERVAL = getattr(settings, 'TASKS_HEARTBEAT_INTERVAL', 60)
+
+_registry = {}
+_worker = {}
+
+
+def worker_id():
+    """Имя текущего процесса-воркера, своё и у процессов после fork."""
+    pid = os.getpid()
+    if pid not in _worker:
+        _worker[pid] = f'{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}'
+    return _worker[pid]
+
+
+def task(func=None, *, max_attempts=5, unique=False):
+    """Регистрирует функцию как задачу и добавляет ей методы delay()
+    и delay_in(seconds, ...)."""
+    def register(func):
+        name = f'{func.__module__}.{func.__name__}'
+        func.task_name = name
+        func.max_attempts = max_attempts
+        func.unique = unique
+        func.delay = lambda *args, **kwargs: enqueue(func, *args, **kwargs)
+        func.delay_in = lambda seconds, *args, **kwargs: enqueue(
+            func, *args, _countdown=seconds, **kwargs)
+        _registry[name] = func
+        return func
+    return register(func) if func else register
+
+
+def enqueue(func, *args, _countdown=0, **kwargs):
+    """Ставит задачу в очередь; _countdown - через сколько секунд её
+    можно выполнять."""
+    payload = json.dumps({'args': args, 'kwargs': kwargs},
+                         sort_keys=True, ensure_ascii=False)
+    if ALWAYS_EAGER:
+        func(*args, **kwargs)
+        return None
+    if func.unique:
+        pending = Job.objects.filter(name=func.task_name, payload=payload,
+                                     status=Job.QUEUED).order_by('pk').first()
+        if pending is not None:
+            return pending
+    return Job.objects.create(
+        name=func.task_name, payload=payload, max_attempts=func.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=_countdown))
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, которые умерли на полпути,
+    и помечает FAILED те, у которых кончились попытки."""
+    now = timezone.now()
+    deadline = now - timedelta(seconds=STALE_AFTER)
+    stale = Job.objects.filter(
+        Q(heartbeat__lt=deadline)
+        | Q(heartbeat__isnull=True, started__lt=deadline),
+        status=Job.RUNNING)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished=now, worker='',
+        last_error='Воркер остановился, не завершив задачу')
+    return stale.update(status=Job.QUEUED, worker='')
+
+
+def _claimed(job):
+    """Строка задачи, пока она остаётся за взявшим её воркером: номер
+    попытки отличает этот захват от следующих."""
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING,
+                              worker=job.worker, attempts=job.attempts)
+
+
+def claim():
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.QUEUED, run_after__lte=now
+    ).order_by('run_after', 'pk').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, started=now, heartbeat=now,
+            worker=worker_id(), attempts=F('attempts') + 1)
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _beat(job, stop):
+    try:
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            if not _claimed(job).update(heartbeat=timezone.now()):
+                return
+    finally:
+        connection.close()
+
+
+@contextmanager
+def heartbeat(job):
+    """Пока выполняется блок, отдельный поток отмечает, что воркер жив."""
+    stop = threading.Event()
+    beater = threading.Thread(target=_beat, args=(job, stop), daemon=True)
+    beater.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        beater.join()
+
+
+def run(job):
+    func = _registry.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Неизвестная задача {job.name}')
+        payload = json.loads(job.payload)
+        with heartbeat(job):
+            func(*payload['args'], **payload['kwargs'])
+    except Exception:
+        logger.exception('Задача %s упала', job)
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(
+                seconds=backoff(job.attempts))
+        else:
+            job.status = Job.FAILED
+            job.finished = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.finished = timezone.now()
+    if not _claimed(job).update(status=job.status, run_after=job.run_after,
+                                finished=job.finished,
+                                last_error=job.last_error):
+        logger.warning('Задачу %s уже забрал другой воркер', job)
+    return job.status == Job.DONE
+
+
+def work_once():
+    job = claim()
+    if job is None:
+        return None
+    return run(job)
@@ -0,0 +1,40 @@
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Job
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(share * (len(values) - 1))))
+    return values[index]
+
+
+def summary(values):
+    values = sorted(values)
+    return {'p50': percentile(values, 0.5),
+            'p95': percentile(values, 0.95),
+            'max': values[-1] if values else None}
+
+
+def queue_stats(window=1000):
+    """Глубина очереди по статусам и задержки последних задач, секунды."""
+    depth = dict(Job.objects.order_by().values_list('status').annotate(
+        total=Count('pk')))
+    oldest = Job.objects.filter(status=Job.QUEUED).order_by(
+        'created').values_list('created', flat=True).first()
+    recent = Job.objects.filter(status=Job.DONE).order_by(
+        '-finished').values_list('created', 'started', 'finished')[:window]
+    waits, runs = [], []
+    for created, started, finished in recent:
+        waits.append((started - created).total_seconds())
+        runs.append((finished - started).total_seconds())
+    return {
+        'depth': {status: depth.get(status, 0)
+                  for status, _ in Job.STATUS_CHOICES},
+        'oldest_queued_age': ((timezone.now() - oldest).total_seconds()
+                              if oldest else None),
+        'wait': summary(waits),
+        'run': summary(runs),
+    }
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.core import mail
+from django.db.models import F
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from . import queue
+from .models import Job
+from .stats import queue_stats
+
+CALLS = []
+
+
+@queue.task(max_attempts=2)
+def remember(value):
+    CALLS.append(value)
+
+
+@queue.task(unique=True)
+def explode():
+    raise ValueError('бум')
+
+
+class QueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_job_runs_in_worker(self):
+        """Задача пишется в базу и выполняется воркером."""
+        remember.delay('привет')
+        self.assertEqual(CALLS, [])
+        self.assertTrue(queue.work_once())
+        self.assertEqual(CALLS, ['привет'])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertIsNone(queue.work_once())
+
+    def test_failed_job_is_retried_with_backoff(self):
+        """Упавшая задача откладывается, а после лимита попыток - FAILED."""
+        job = explode.delay()
+        self.assertFalse(queue.work_once())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('бум', job.last_error)
+        Job.objects.update(run_after=timezone.now(), max_attempts=2)
+        queue.work_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_unique_job_is_queued_once(self):
+        """Одинаковая уникальная задача не дублируется в очереди."""
+        self.assertEqual(explode.delay(), explode.delay())
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_stale_running_job_is_requeued(self):
+        """Задачу умершего воркера снова берут в работу, а живую - нет."""
+        dead, alive = remember.delay(1), remember.delay(2)
+        long_ago = timezone.now() - timedelta(days=1)
+        Job.objects.update(status=Job.RUNNING, attempts=1, started=long_ago,
+                           heartbeat=long_ago, worker='умерший')
+        Job.objects.filter(pk=alive.pk).update(heartbeat=timezone.now(),
+                                               worker='живой')
+        self.assertEqual(queue.requeue_stale(), 1)
+        dead.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual(dead.status, Job.QUEUED)
+        self.assertEqual(alive.status, Job.RUNNING)
+
+    def test_job_killing_its_worker_fails_after_max_attempts(self):
+        """Задача, на которой каждый раз умирает воркер, не крутится
+        вечно."""
+        job = remember.delay(1)
+        Job.objects.update(status=Job.RUNNING, attempts=job.max_attempts,
+                           started=timezone.now() - timedelta(days=1))
+        self.assertEqual(queue.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_result_is_not_saved_after_claim_is_lost(self):
+        """Если задачу, пока она шла, забрал другой воркер, итог первого
+        его статус не перезаписывает."""
+        remember.delay(1)
+        job = queue.claim()
+        Job.objects.update(worker='другой', attempts=F('attempts') + 1)
+        self.assertTrue(queue.run(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.worker, 'другой')
+
+    def test_queue_stats(self):
+        """Статистика показывает глубину очереди и задержки."""
+        remember.delay(1)
+        remember.delay(2)
+        queue.work_once()
+        stats = queue_stats()
+        self.assertEqual(stats['depth'][Job.QUEUED], 1)
+        self.assertEqual(stats['depth'][Job.DONE], 1)
+        self.assertIsNotNone(stats['wait']['p95'])
+
+    def test_signup_sends_welcome_email_in_background(self):
+        """Письмо после регистрации отправляет воркер, а не запрос."""
+        Client().post(reverse('users:signup'), {
+            'username': 'newbie', 'email': 'newbie@yatube.ru',
+            'password1': 'Sup3r-secret!', 'password2': 'Sup3r-secret!'})
+        self.assertEqual(len(mail.outbox), 0)
+        queue.work_once()
+        self.assertEqual(len(mail.outbox), 1)
@@ -1,6 +1,7 @@
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from .forms import CreationForm
+from .jobs import send_welcome_email
 
 
 app_name = 'users'
@@ -10,3 +11,8 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        send_welcome_email.delay(self.object.pk)
+        return response
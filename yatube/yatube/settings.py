@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
 
+from core.sqlite import database_settings
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Quick-start development settings - unsuitable for production
@@ -42,10 +44,14 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'search.apps.SearchConfig',
+    'tasks.apps.TasksConfig',
     'sorl.thumbnail'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryInstrumentationMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,13 +86,26 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль SQLite из core.sqlite.PROFILES: 'production' (WAL, прагмы,
+# постоянные соединения) или 'plain' (настройки по умолчанию).
+SQLITE_PROFILE = os.environ.get('YATUBE_SQLITE_PROFILE', 'production')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': database_settings(os.path.join(BASE_DIR, 'db.sqlite3'),
+                                 SQLITE_PROFILE),
 }
 
+# Реплики для чтения лент (core.routers): пути к файлам SQLite через
+# запятую; копии основной базы обновляет manage.py sync_replicas.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('YATUBE_REPLICAS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = database_settings(path, SQLITE_PROFILE)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -144,9 +163,65 @@ ALLOWED_HOSTS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Отдавать media самим Django (core.views.serve_media, с вечным кешем
+# файлов с хешем в имени) и без DEBUG - если перед приложением нет
+# веб-сервера, который делает это сам (см. core.storage).
+SERVE_MEDIA = DEBUG or os.environ.get('YATUBE_SERVE_MEDIA') == '1'
+
+# Загрузки всегда идут во временный файл и обрезаются на UPLOAD_MAX_SIZE
+# (см. core.uploads).
+FILE_UPLOAD_HANDLERS = ['core.uploads.CappedUploadHandler']
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 40_000_000
+UPLOAD_MAX_DIMENSION = 2560
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BulkKVStore'
+
+TASKS_ALWAYS_EAGER = False
+
+QUERY_INSTRUMENTATION = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.queries': {'handlers': ['console'], 'level': 'INFO',
+                           'propagate': False},
+        'yatube.uploads': {'handlers': ['console'], 'level': 'INFO',
+                           'propagate': False},
+    },
+}
+
+# Тесты подменяют LOCATION кешей временным каталогом
+# (core.test_runner).
+TEST_RUNNER = 'core.test_runner.TemporaryCacheRunner'
 
+# L1 в памяти процесса и общий для процессов L2 в файле SQLite. Версии
+# лент (posts.feed_cache) читаются только из L2, чтобы все процессы
+# сразу видели их смену.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.tiered.TieredCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_PATH',
+                                   os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'L2_ONLY': ['feed-version:'],
+        },
     }
 }
+# Кеш в общей памяти процессов одной машины (core.cache_backends.shm):
+# быстрее, но без блокировки пересчёта и с потерей при перезагрузке.
+if os.environ.get('YATUBE_CACHE') == 'shm':
+    CACHES['default'] = {
+        'BACKEND': 'core.cache_backends.shm.SharedMemoryCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_PATH',
+                                   '/dev/shm/yatube-cache'),
+        'OPTIONS': {'SLOTS': 4096, 'SLOT_SIZE': 64 * 1024},
+    }
@@ -13,23 +13,29 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import query_stats, serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls', namespace='users')),
     path('about/', include('about.urls', namespace='about')),
-    path('auth/', include('django.contrib.auth.urls'))
+    path('search/', include('search.urls', namespace='search')),
+    path('auth/', include('django.contrib.auth.urls')),
+    path('debug/queries/', query_stats, name='query_stats'),
 ]
 
 handler404 = 'core.views.page_not_found'
 
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+# django.conf.urls.static.static() работает только при DEBUG.
+if getattr(settings, 'SERVE_MEDIA', settings.DEBUG):
+    urlpatterns += [re_path(
+        r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+        serve_media)]